@@ -0,0 +1,354 @@
+"""Band gap, band edges, effective masses and spin polarization
+
+Everything is computed with a few reductions over the (kpoint x band)
+energies or the DoS, no figure is needed. The effective masses of all
+bands and path segments are fitted as one batched least squares.
+
+Example
+-------
+>>> from vasp_h5 import Result
+>>> r = Result("/path/to/calculation")
+>>> edges = r.band_edges['total']
+>>> edges.gap, edges.is_direct, edges.vbm_label, edges.cbm_label
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+
+BandEdges = namedtuple(
+  typename='BandEdges',
+  field_names=[
+    'gap', 'direct_gap', 'is_direct', 'is_metal',
+    'vbm', 'cbm', 'vbm_kpoint', 'cbm_kpoint', 'vbm_label', 'cbm_label',
+    'direct_kpoint',
+  ],
+)
+BandEdges.__doc__ = """Band edges of one spin (or of both spins together)
+
+Energies are relative to the Fermi energy, k-points are indices into the
+k-point path, labels are '' away from high-symmetry points. A metal has
+`gap` and `direct_gap` 0.
+"""
+
+
+def _label(labels, kpoint: int) -> str:
+  if labels is None or kpoint >= len(labels):
+    return ''
+  label = labels[kpoint]
+  return label.decode() if isinstance(label, bytes) else str(label or '')
+
+
+def occupied_states(occupations: np.ndarray, tolerance: float = 0.1) -> tuple:
+  """Occupied states and partial filling from the occupations of one spin
+
+  The number of occupied bands is the occupation per k-point averaged 
+  over all k-points and rounded, so a Fermi energy a few meV below the 
+  VBM, e.g. with Gaussian smearing or in a non-SCF line-mode run, doesn't 
+  empty the VBM. A band whose mean occupation lies between `tolerance` 
+  and 1 - `tolerance` is partially filled, i.e. a metal.
+
+  Parameters
+  ----------
+  occupations : np.ndarray
+    (kpoint x band), 1 (or 2) for a filled state
+
+  Returns
+  -------
+  tuple
+    (occupied (kpoint x band) bool, is_partial)
+  """
+  occupations = np.asarray(occupations, dtype=float)
+  occupations = occupations / max(1.0, occupations.max())
+  number = int(np.rint(occupations.sum(axis=1).mean()))
+  occupied = np.broadcast_to(np.arange(occupations.shape[1]) < number, occupations.shape)
+  mean = occupations.mean(axis=0)
+  return occupied, bool(np.any((mean > tolerance) & (mean < 1 - tolerance)))
+
+
+def _edges(energies: np.ndarray, occupied: np.ndarray, is_partial: bool, labels) -> BandEdges:
+  # highest occupied / lowest unoccupied state per k-point
+  top = np.where(occupied, energies, -np.inf).max(axis=1)
+  bottom = np.where(occupied, np.inf, energies).min(axis=1)
+  vbm_kpoint, cbm_kpoint = int(np.argmax(top)), int(np.argmin(bottom))
+  vbm, cbm = float(top[vbm_kpoint]), float(bottom[cbm_kpoint])
+  direct = bottom - top
+  direct_kpoint = int(np.argmin(direct))
+
+  # a band with states on both sides, or overlapping bands
+  is_metal = bool(
+    is_partial or np.any(occupied.any(axis=0) & ~occupied.all(axis=0)) or cbm <= vbm
+  )
+  gap = 0.0 if is_metal else cbm - vbm
+  direct_gap = 0.0 if is_metal else float(direct[direct_kpoint])
+  return BandEdges(
+    gap = gap,
+    direct_gap = direct_gap,
+    is_direct = not is_metal and bool(np.isclose(direct_gap, gap)),
+    is_metal = is_metal,
+    vbm = vbm, cbm = cbm,
+    vbm_kpoint = vbm_kpoint, cbm_kpoint = cbm_kpoint,
+    vbm_label = _label(labels, vbm_kpoint),
+    cbm_label = _label(labels, cbm_kpoint),
+    direct_kpoint = direct_kpoint,
+  )
+
+
+def _occupied(energies: np.ndarray, occupations: np.ndarray = None) -> tuple:
+  """(occupied, is_partial) from the occupations, or from the sign of 
+  the energies relative to the Fermi energy without them
+  """
+  if occupations is None:
+    return energies <= 0, False
+  return occupied_states(occupations)
+
+
+def band_edges(
+  energies: np.ndarray, labels: list = None, fermi_energy: float = 0.0, 
+  occupations: np.ndarray = None
+) -> BandEdges:
+  """Band gap, VBM and CBM of the energies of one spin
+
+  The occupied states are found from `occupations`, see 
+  `occupied_states`. Without them, states at or below the Fermi energy 
+  count as occupied. A band that is occupied at some k-points but not at 
+  others, or partially filled, makes a metal.
+
+  Parameters
+  ----------
+  energies : np.ndarray
+    band energies (kpoint x band)
+  labels : list, optional
+    label of every k-point, '' or None if it has none
+  fermi_energy : float
+    subtracted from `energies`, 0 for energies already shifted by py4vasp
+  occupations : np.ndarray, optional
+    occupations (kpoint x band), as returned by `band.read()`
+  """
+  energies = np.asarray(energies) - fermi_energy
+  return _edges(energies, *_occupied(energies, occupations), labels)
+
+
+def spin_band_edges(
+  bands: dict, labels: list = None, fermi_energy: float = 0.0, 
+  occupations: dict = None
+) -> dict:
+  """`band_edges` per spin, and of both spins together as 'total'
+
+  Parameters
+  ----------
+  bands : dict
+    {'bands': ...} or {'up': ..., 'down': ...}, see `ProjectedBand.bands`
+  occupations : dict, optional
+    the occupations with the keys of `bands`, see 
+    `ProjectedBand.occupations`
+
+  Returns
+  -------
+  dict
+    {'bands': BandEdges} or {'up': ..., 'down': ..., 'total': ...}
+  """
+  energies = {name: np.asarray(value) - fermi_energy for name, value in bands.items()}
+  occupied = {
+    name: _occupied(value, occupations[name] if occupations else None)
+    for name, value in energies.items()
+  }
+  edges = {
+    name: _edges(value, *occupied[name], labels) for name, value in energies.items()
+  }
+  if len(bands) > 1:
+    # the gap between the highest occupied and lowest unoccupied state of any spin
+    edges['total'] = _edges(
+      np.hstack(list(energies.values())),
+      np.hstack([mask for mask, _ in occupied.values()]),
+      any(is_partial for _, is_partial in occupied.values()),
+      labels,
+    )
+  return edges
+
+
+# ħ²/2mₑ in eV Å²
+HBAR2_2ME = 3.80998
+
+EffectiveMass = namedtuple(
+  typename='EffectiveMass',
+  field_names=[
+    'spin', 'edge', 'band', 'direction', 'kpoint', 'energy', 'mass', 'alpha',
+  ],
+)
+EffectiveMass.__doc__ = """Effective mass of one band at a band edge along one path segment
+
+`mass` is in units of the electron mass, negative for the holes at the
+VBM. `alpha` (1/eV) is the non-parabolicity, 0 for a parabolic fit.
+"""
+
+
+def path_segments(distances: np.ndarray, labels: list = None) -> list:
+  """The straight segments of the k-point path as (start, stop) indices
+
+  A segment ends where the next k-point repeats its distance (line mode
+  writes both ends of every line) or at a labeled k-point, which then also
+  starts the next segment.
+  """
+  distances = np.asarray(distances)
+  starts = [0, *(np.flatnonzero(np.diff(distances) == 0) + 1).tolist(), len(distances)]
+  segments = []
+  for start, stop in zip(starts[:-1], starts[1:]):
+    corners = [
+      kpoint for kpoint in range(start + 1, stop - 1) if _label(labels, kpoint)
+    ]
+    bounds = [start, *corners, stop - 1]
+    segments.extend((a, b + 1) for a, b in zip(bounds[:-1], bounds[1:]))
+  return [(start, stop) for start, stop in segments if stop - start > 1]
+
+
+def _solve_weighted(design: np.ndarray, target: np.ndarray, weights: np.ndarray) -> np.ndarray:
+  """Weighted least squares of many fits at once via the normal equations
+
+  (fit x point x coefficient), (fit x point), (fit x point) -> (fit x coefficient)
+  """
+  matrix = np.einsum('fpi,fp,fpj->fij', design, weights, design)
+  vector = np.einsum('fpi,fp,fp->fi', design, weights, target)
+  # pinv keeps degenerate fits, e.g. of a flat band, from failing all others
+  return (np.linalg.pinv(matrix) @ vector[..., None])[..., 0]
+
+
+def fit_effective_masses(
+  bands: dict, distances: np.ndarray, labels: list = None,
+  fit_points: int = 5, window: float = 0.05, 
+  is_nonparabolic: bool = False, k_scale: float = 2 * np.pi,
+  occupations: dict = None,
+) -> list:
+  """Fit the effective masses at the VBM and CBM along every path segment
+
+  Around each band edge, every band within `window` of it is fitted on up
+  to `fit_points` k-points on both sides along every segment through the
+  edge. All fits are solved together as one batched least squares.
+
+  Parabolic: E = E₀ + c k + (ħ²/2m*) k², non-parabolic (Kane):
+  (ħ²/2m) k² = m* ε (1 + α ε) with ε = E - E₀.
+
+  Parameters
+  ----------
+  bands : dict
+    {'bands': ...} or {'up': ..., 'down': ...}, energies (kpoint x band)
+  distances : np.ndarray
+    the k-point distances along the path
+  labels : list, optional
+    label of every k-point, used for the segments and their names
+  fit_points : int
+    k-points on each side of the edge used in a fit
+  window : float
+    bands closer than this (eV) to the edge at its k-point are fitted too,
+    e.g. the heavy and light holes
+  is_nonparabolic : bool
+    fit the Kane dispersion instead of a parabola
+  k_scale : float
+    factor of `distances` to 1/Å, py4vasp gives them without the 2π
+  occupations : dict, optional
+    the occupations with the keys of `bands`, used to find the edges, see
+    `band_edges`
+
+  Returns
+  -------
+  list
+    EffectiveMass per spin, edge, band and segment
+  """
+  distances = np.asarray(distances)
+  segments = path_segments(distances, labels)
+  fits, windows = [], []
+  for spin, energies in bands.items():
+    energies = np.asarray(energies)
+    edges = band_edges(
+      energies, labels, occupations = occupations[spin] if occupations else None
+    )
+    for edge, kpoint, energy in (
+      ('vbm', edges.vbm_kpoint, edges.vbm), ('cbm', edges.cbm_kpoint, edges.cbm)
+    ):
+      if not np.isfinite(energy):
+        continue
+      candidates = np.flatnonzero(np.abs(energies[kpoint] - energy) <= window)
+      # the edge and its copies at the ends of neighbouring lines
+      centers = np.flatnonzero(distances == distances[kpoint])
+      for start, stop in segments:
+        for center in centers[(centers >= start) & (centers < stop)]:
+          points = np.arange(max(start, center - fit_points), min(stop, center + fit_points + 1))
+          direction = f"{_label(labels, start) or start}-{_label(labels, stop - 1) or stop - 1}"
+          for band in candidates:
+            fits.append(EffectiveMass(
+              spin, edge, int(band), direction, int(center), 
+              float(energies[center, band]), np.nan, 0.0,
+            ))
+            windows.append((points, energies[points, band], center))
+  if not fits:
+    return []
+
+  number_points = max(len(points) for points, _, _ in windows)
+  k = np.zeros((len(fits), number_points))
+  energy = np.zeros_like(k)
+  weights = np.zeros_like(k)
+  for index, (points, values, center) in enumerate(windows):
+    k[index, :len(points)] = k_scale * (distances[points] - distances[center])
+    energy[index, :len(points)] = values - values[points == center][0]
+    weights[index, :len(points)] = 1
+  # a fit needs more points than coefficients
+  usable = weights.sum(axis=1) > 3
+  k, energy, weights = k[usable], energy[usable], weights[usable]
+
+  if is_nonparabolic:
+    # (ħ²/2mₑ) k² = m* ε + m* α ε²
+    design = np.stack((energy, energy**2), axis=-1)
+    coefficients = _solve_weighted(design, HBAR2_2ME * k**2, weights)
+    masses = coefficients[:, 0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+      alphas = coefficients[:, 1] / masses
+  else:
+    design = np.stack((np.ones_like(k), k, k**2), axis=-1)
+    coefficients = _solve_weighted(design, energy, weights)
+    with np.errstate(divide='ignore'):
+      masses = HBAR2_2ME / coefficients[:, 2]
+    alphas = np.zeros_like(masses)
+
+  return [
+    fit._replace(mass = float(mass), alpha = float(alpha))
+    for fit, mass, alpha in zip(
+      (fit for fit, use in zip(fits, usable) if use), masses, alphas
+    )
+  ]
+
+
+SPIN_MODES = ('difference', 'polarization')
+
+
+def spin_pairs(names: list) -> dict:
+  """Match the spin up and down curves by name
+
+  'up'/'down' are the totals, '<label>_up'/'<label>_down' the projections.
+
+  Returns
+  -------
+  dict
+    {label: (name up, name down)}, 'total' for the totals first
+  """
+  names = set(names)
+  pairs = {}
+  for name in sorted(names):
+    if name == 'up' or name.endswith('_up'):
+      down = name[:-2] + 'down'
+      if down in names:
+        pairs[name[:-3] or 'total'] = (name, down)
+  return dict(sorted(pairs.items(), key=lambda pair: pair[0] != 'total'))
+
+
+def spin_difference(up: np.ndarray, down: np.ndarray) -> np.ndarray:
+  """up - down, e.g. the exchange splitting of the bands"""
+  return np.asarray(up) - np.asarray(down)
+
+
+def spin_polarization(up: np.ndarray, down: np.ndarray) -> np.ndarray:
+  """(up - down) / (up + down), 0 where both vanish"""
+  up, down = np.asarray(up, dtype=float), np.asarray(down, dtype=float)
+  total = up + down
+  with np.errstate(divide='ignore', invalid='ignore'):
+    return np.where(total > 0, (up - down) / total, 0.0)
@@ -0,0 +1,91 @@
+"""Benchmark reading the projections of a selection, full tensor vs hyperslab
+
+Example
+-------
+  $ python benchmarks/bench_h5_reading.py --atoms 200 --kpoints 400 --bands 400
+"""
+
+import argparse, os, sys, tempfile, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import h5py
+import numpy as np
+
+from projection import ProjectionLayout, ProjectionTensor
+from reader import DATASETS, H5Reader
+
+ORBITALS = ['s', 'py', 'pz', 'px', 'dxy', 'dyz', 'dz2', 'dxz', 'x2-y2']
+
+
+def write_synthetic(path: str, atoms: int, kpoints: int, bands: int) -> None:
+  """vaspout.h5 with a chunked band projection dataset (spin x atom x orbital x k x band)"""
+  rng = np.random.default_rng(0)
+  shape = (2, atoms, len(ORBITALS), kpoints, bands)
+  with h5py.File(path, 'w', libver='latest') as file:
+    dataset = file.create_dataset(
+      DATASETS['band_projections'], shape, dtype='f8',
+      chunks = (1, 1, len(ORBITALS), kpoints, min(bands, 64)),
+    )
+    for atom in range(atoms):
+      dataset[:, atom] = rng.uniform(0, 1, (2, len(ORBITALS), kpoints, bands))
+    file[DATASETS['orbital_types']] = np.array(ORBITALS, dtype='S')
+
+
+def best_of(repeat: int, func) -> float:
+  timings = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    func()
+    timings.append(time.perf_counter() - start)
+  return min(timings)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--atoms', type=int, default=200)
+  parser.add_argument('--kpoints', type=int, default=400)
+  parser.add_argument('--bands', type=int, default=400)
+  parser.add_argument('--selection', default='V(d)')
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+
+  # the first half of the atoms are V, the others O
+  elements = ['V'] * (args.atoms // 2) + ['O'] * (args.atoms - args.atoms // 2)
+  with tempfile.TemporaryDirectory() as folder:
+    write_synthetic(
+      os.path.join(folder, H5Reader.FILENAME), args.atoms, args.kpoints, args.bands
+    )
+    print(f"{args.atoms} atoms x {len(ORBITALS)} orbitals x {args.kpoints} "
+          f"k-points x {args.bands} bands, selection {args.selection!r}")
+
+    def full(reader):
+      tensor = ProjectionTensor(
+        reader.read('band_projections'), elements, reader.read_strings('orbital_types')
+      )
+      return tensor.project(args.selection)
+
+    def partial(reader):
+      layout = ProjectionLayout(
+        elements, reader.read_strings('orbital_types'),
+        reader.shape('band_projections')[0],
+      )
+      compiled = layout.compile(args.selection)
+      needed = compiled.needed()
+      block = reader.read_hyperslab('band_projections', needed)
+      return compiled.sum_block(block, needed)
+
+    expected = full(H5Reader(folder))
+    for name, func in (('full', full), ('hyperslab', partial)):
+      for cache_size in (2**20, 64 * 2**20):
+        reader = H5Reader(folder, cache_size=cache_size)
+        projected = func(reader)
+        assert all(np.allclose(projected[key], expected[key]) for key in expected)
+        bytes_read = reader.bytes_read
+        seconds = best_of(args.repeat, lambda: func(reader))
+        print(f"  {name:>9} (cache {cache_size // 2**20:3d} MiB, swmr {reader.swmr!s:>5}) : "
+              f"{seconds:8.3f} s, {bytes_read / 2**20:8.1f} MiB read")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,102 @@
+"""Benchmark the JSON serialization of a large band figure
+
+Example
+-------
+  $ python benchmarks/bench_serialization.py --bands 2000 --kpoints 200
+"""
+
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import plotly
+try:
+  import orjson  # noqa: F401
+  HAS_ORJSON = True
+except ImportError:
+  HAS_ORJSON = False
+import plotly.graph_objs as go
+
+from plotly_object import _encode_array
+from vasp_data import ProjectedBand
+from vasp_h5 import BandFigure
+
+
+class SyntheticBand:
+  """Mimic `py4vasp.data.Band.to_plotly` with one fat-band trace per band
+  """
+  def __init__(self, number_bands: int, number_kpoints: int) -> None:
+    rng = np.random.default_rng(0)
+    self.distances = np.linspace(0, 3, number_kpoints)
+    self.bands = (
+      np.linspace(-60, 40, number_bands)[None, :] 
+      + np.sin(self.distances[:, None] * rng.uniform(1, 4, number_bands))
+    )
+    self.weights = rng.uniform(0, 1, self.bands.shape)
+
+  def to_plotly(self, selection: str = None, width: float = None, window: tuple = (None, None)):
+    width = 0.5 if width is None else width
+    x = np.concatenate((self.distances, self.distances[::-1]))
+    kept = ProjectedBand.band_range({'bands': self.bands}, window)
+    upper = (self.bands + width * self.weights)[:, kept]
+    lower = (self.bands - width * self.weights)[:, kept]
+    figure = go.Figure(data=[
+      go.Scatter(
+        x = x, y = np.concatenate((lower[:, i], upper[::-1, i])), 
+        name = selection, legendgroup = selection, showlegend = i == 0, 
+      )
+      for i in range(upper.shape[1])
+    ])
+    figure.layout.xaxis.tickvals = self.distances[::len(self.distances) // 4]
+    return figure
+
+
+def best_of(repeat: int, func) -> float:
+  timings = []
+  for _ in range(repeat):
+    start = time.perf_counter()
+    func()
+    timings.append(time.perf_counter() - start)
+  return min(timings)
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('--bands', type=int, default=2000)
+  parser.add_argument('--kpoints', type=int, default=200)
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+
+  bandfig = BandFigure(SyntheticBand(args.bands, args.kpoints))
+  bandfig.selection = 'V(d)'
+  bandfig.is_pruned = False
+  bandfig.create_figure()
+  fig_dict = bandfig.figure.to_dict()
+  print(f"{args.bands} bands x {args.kpoints} k-points, "
+        f"{len(fig_dict['data'])} traces")
+
+  engines = ['json'] + (['orjson'] if HAS_ORJSON else [])
+  for engine in engines:
+    size = len(plotly.io.to_json(fig_dict, validate=False, engine=engine))
+    seconds = best_of(
+      args.repeat, 
+      lambda: plotly.io.to_json(fig_dict, validate=False, engine=engine)
+    )
+    print(f"  to_json[{engine:>6}] : {seconds:8.3f} s, {size / 2**20:8.1f} MiB")
+  if not HAS_ORJSON:
+    print("  orjson is not installed, `pip install orjson` to compare")
+
+  for trace in fig_dict['data']:
+    for key in ('x', 'y'):
+      trace[key] = _encode_array(trace[key]) or trace[key]
+  size = len(plotly.io.to_json(fig_dict, validate=False, engine='auto'))
+  seconds = best_of(
+    args.repeat, 
+    lambda: plotly.io.to_json(fig_dict, validate=False, engine='auto')
+  )
+  print(f"  to_json[base64] : {seconds:8.3f} s, {size / 2**20:8.1f} MiB")
+
+
+if __name__ == '__main__':
+  main()
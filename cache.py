@@ -0,0 +1,72 @@
+"""Per-instance caching of values read from vaspout.h5
+
+Example
+-------
+>>> class Result:
+...   @cached_read
+...   def energy(self):
+...     return self.calc.energy.read()
+"""
+
+import os
+
+
+def file_signature(path: str) -> tuple:
+  """(mtime in ns, size) of `path`, None if it doesn't exist"""
+  try:
+    stat = os.stat(path)
+  except OSError:
+    return None
+  return (stat.st_mtime_ns, stat.st_size)
+
+
+class cached_read:
+  """A read-only property cached per instance until the file changes
+
+  The owner must have a `reader` attribute whose `path` is the file the
+  value is read from. Every access compares the mtime/size of that file
+  with the one at the time of reading, so a file rewritten by VASP is
+  read again automatically. `clear_read_cache` drops all cached values.
+
+  Values read from another file of the calculation, e.g. the INCAR, pass 
+  its name with `@cached_read(filename='INCAR')`, that file is compared 
+  instead, it is looked up next to `reader.path`.
+
+  Note
+  ----
+  The cached value is returned as is, modifying it modifies the cache.
+  """
+  def __new__(cls, func=None, *, filename: str = None):
+    if func is None:
+      return lambda func: cls(func, filename=filename)
+    return super().__new__(cls)
+
+  def __init__(self, func, *, filename: str = None) -> None:
+    self.func = func
+    self.name = func.__name__
+    self.__doc__ = func.__doc__
+    self.filename = filename
+
+  def __set_name__(self, owner, name: str) -> None:
+    self.name = name
+
+  def __get__(self, instance, owner=None):
+    if instance is None:
+      return self
+    cache = instance.__dict__.setdefault('_read_cache', {})
+    path = instance.reader.path
+    if self.filename:
+      path = os.path.join(os.path.dirname(path), self.filename)
+    signature = file_signature(path)
+    if self.name in cache:
+      cached_signature, value = cache[self.name]
+      if cached_signature == signature:
+        return value
+    value = self.func(instance)
+    cache[self.name] = (signature, value)
+    return value
+
+
+def clear_read_cache(instance) -> None:
+  """Drop every value cached by `cached_read` on `instance`"""
+  instance.__dict__.pop('_read_cache', None)
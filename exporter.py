@@ -0,0 +1,176 @@
+"""Write named numeric columns to .npz, .csv or .parquet chunk by chunk
+
+Example
+-------
+>>> with get_exporter('band.csv', metadata={'fermi_energy': 1.2}) as exporter:
+...   for columns in chunks:
+...     exporter.write(columns)
+"""
+
+import csv, os, shutil, tempfile, zipfile
+
+import numpy as np
+
+
+class ExportFormatError(Exception):
+  pass
+
+
+class Exporter:
+  """Base class of the column writers
+
+  Every call of `write` appends one chunk, a dict of equally long 1D arrays
+  with the same keys in every chunk, so that only one chunk has to be kept
+  in memory.
+
+  Parameters
+  ----------
+  path : str
+    the output file
+  metadata : dict, optional
+    scalars or short arrays stored next to the columns, e.g. fermi energy
+  """
+  def __init__(self, path: str, metadata: dict = None) -> None:
+    self.path = path
+    self.metadata = metadata or {}
+    self.number_rows = 0
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args) -> None:
+    self.close()
+
+  def write(self, columns: dict) -> None:
+    raise NotImplementedError
+
+  def close(self) -> None:
+    pass
+
+
+class CsvExporter(Exporter):
+  """Metadata as `# key = value` comment lines, then a header and rows"""
+  def __init__(self, path: str, metadata: dict = None) -> None:
+    super().__init__(path, metadata)
+    self._file = open(path, 'w', newline='')
+    self._writer = csv.writer(self._file)
+    for key, value in self.metadata.items():
+      self._file.write(f"# {key} = {value}\n")
+    self._header = None
+
+  def write(self, columns: dict) -> None:
+    if self._header is None:
+      self._header = list(columns)
+      self._writer.writerow(self._header)
+    self._writer.writerows(zip(*(
+      np.asarray(columns[key]).tolist() for key in self._header
+    )))
+    self.number_rows += len(columns[self._header[0]])
+
+  def close(self) -> None:
+    if not self._file.closed:
+      self._file.close()
+
+
+class NpzExporter(Exporter):
+  """One .npy member per column, loadable by `numpy.load`
+
+  The chunks of every column are spooled to a temporary file and copied
+  into the archive on `close`, once the final length is known.
+  """
+  def __init__(self, path: str, metadata: dict = None) -> None:
+    super().__init__(path, metadata)
+    self._spool = tempfile.mkdtemp(prefix='export-')
+    self._columns = {}
+
+  def write(self, columns: dict) -> None:
+    length = 0
+    for key, values in columns.items():
+      values = np.ascontiguousarray(values)
+      if key not in self._columns:
+        self._columns[key] = (
+          values.dtype,
+          open(os.path.join(self._spool, f"{len(self._columns)}.bin"), 'wb'),
+        )
+      dtype, file = self._columns[key]
+      file.write(values.astype(dtype, copy=False).tobytes())
+      length = len(values)
+    self.number_rows += length
+
+  def close(self) -> None:
+    if self._spool is None:
+      return
+    with zipfile.ZipFile(self.path, 'w', allowZip64=True) as archive:
+      for key, value in self.metadata.items():
+        with archive.open(f"{key}.npy", 'w', force_zip64=True) as member:
+          np.lib.format.write_array(member, np.asarray(value))
+      for key, (dtype, file) in self._columns.items():
+        file.close()
+        with archive.open(f"{key}.npy", 'w', force_zip64=True) as member:
+          np.lib.format.write_array_header_1_0(member, {
+            'descr': np.lib.format.dtype_to_descr(dtype),
+            'fortran_order': False,
+            'shape': (self.number_rows,),
+          })
+          with open(file.name, 'rb') as spooled:
+            shutil.copyfileobj(spooled, member)
+    shutil.rmtree(self._spool, ignore_errors=True)
+    self._spool = None
+
+
+class ParquetExporter(Exporter):
+  """One row group per chunk, requires `pyarrow`"""
+  def __init__(self, path: str, metadata: dict = None) -> None:
+    super().__init__(path, metadata)
+    try:
+      import pyarrow, pyarrow.parquet
+    except ImportError as e:
+      raise ExportFormatError(
+        "Parquet export requires pyarrow, `pip install pyarrow`"
+      ) from e
+    self._pa, self._pq = pyarrow, pyarrow.parquet
+    self._writer = None
+
+  def write(self, columns: dict) -> None:
+    table = self._pa.table({
+      key: np.asarray(values) for key, values in columns.items()
+    })
+    if self._writer is None:
+      schema = table.schema.with_metadata({
+        str(key): str(value) for key, value in self.metadata.items()
+      })
+      self._writer = self._pq.ParquetWriter(self.path, schema)
+    self._writer.write_table(table.cast(self._writer.schema))
+    self.number_rows += table.num_rows
+
+  def close(self) -> None:
+    if self._writer is not None:
+      self._writer.close()
+      self._writer = None
+
+
+EXPORTERS = {
+  'npz': NpzExporter,
+  'csv': CsvExporter,
+  'parquet': ParquetExporter,
+}
+
+
+def get_exporter(path: str, fmt: str = None, metadata: dict = None) -> Exporter:
+  """Create the exporter of `fmt`, guessed from the extension of `path`
+
+  Parameters
+  ----------
+  path : str
+    the output file
+  fmt : str, optional
+    'npz', 'csv' or 'parquet'
+  metadata : dict, optional
+    scalars or short arrays stored next to the columns
+  """
+  fmt = (fmt or os.path.splitext(path)[1].lstrip('.')).lower()
+  if fmt not in EXPORTERS:
+    raise ExportFormatError(
+      f"Unknown export format {fmt!r}, use one of {list(EXPORTERS)}"
+    )
+  return EXPORTERS[fmt](path, metadata)
@@ -0,0 +1,226 @@
+"""A SQLite index of the calculations below a folder
+
+The key quantities of every vaspout.h5 are stored once, later searches
+only read the database and open the matching folders.
+
+Example
+-------
+>>> from indexer import CalculationIndex
+>>> index = CalculationIndex("calculations.sqlite")
+>>> index.update(r"D:\\Ubuntu\\Shared\\VS2")   # reads new/changed files only
+>>> results = index.query(
+...   "gap > ? AND folder LIKE ?", (0.5, '%01-FM%'), incar={'LDAUU': '0 1.00 0'}
+... )
+"""
+
+import hashlib, json, os, re, sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from py4vasp import Calculation
+
+from cache import file_signature
+from reader import H5Reader
+from result_set import EXTRACTS, extract_folder
+from vasp_h5 import Result
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calculations (
+  folder       TEXT PRIMARY KEY,
+  mtime_ns     INTEGER,
+  size         INTEGER,
+  hash         TEXT,
+  system       TEXT,
+  energy       REAL,
+  gap          REAL,
+  total_moment REAL,
+  volume       REAL,
+  incar        TEXT
+);
+CREATE TABLE IF NOT EXISTS incar (
+  folder TEXT REFERENCES calculations(folder) ON DELETE CASCADE,
+  tag    TEXT,
+  value  TEXT
+);
+CREATE INDEX IF NOT EXISTS incar_tag ON incar(tag, value);
+"""
+
+
+def file_hash(path: str, block_size: int = 2**20) -> str:
+  """blake2b of the content of `path`"""
+  digest = hashlib.blake2b(digest_size=16)
+  with open(path, 'rb') as file:
+    for block in iter(lambda: file.read(block_size), b''):
+      digest.update(block)
+  return digest.hexdigest()
+
+
+def parse_incar(text: str) -> dict:
+  """{TAG: value} of an INCAR, comments dropped and spaces normalized"""
+  tags = {}
+  for line in re.split(r'[\n;]', text or ''):
+    line = re.split(r'[#!]', line, maxsplit=1)[0]
+    if '=' in line:
+      tag, value = line.split('=', 1)
+      tags[tag.strip().upper()] = ' '.join(value.split())
+  return tags
+
+
+def index_folder(folder: str) -> dict:
+  """The row of `folder`: system, INCAR tags and `EXTRACTS`"""
+  row = extract_folder(folder, tuple(EXTRACTS))
+  calc = Calculation.from_path(folder)
+  try:
+    row['system'] = str(calc.system).strip()
+  except Exception:
+    row['system'] = None
+  try:
+    row['incar'] = parse_incar(str(calc.INCAR.read()))
+  except Exception:
+    row['incar'] = {}
+  return row
+
+
+class CalculationIndex:
+  """Calculations found below some folders, stored in a SQLite database
+
+  Parameters
+  ----------
+  database : str
+    the SQLite file, created if missing
+  max_workers : int, optional
+    threads reading the new/changed calculations
+  """
+  def __init__(self, database: str, max_workers: int = None) -> None:
+    self.database = database
+    self.max_workers = max_workers
+    self.connection = sqlite3.connect(database)
+    self.connection.row_factory = sqlite3.Row
+    self.connection.execute('PRAGMA foreign_keys = ON')
+    self.connection.executescript(SCHEMA)
+
+  def __repr__(self) -> str:
+    return f"{self.__class__.__name__}({self.database!r})"
+
+  def __len__(self) -> int:
+    return self.connection.execute('SELECT COUNT(*) FROM calculations').fetchone()[0]
+
+  def close(self) -> None:
+    self.connection.close()
+
+  def __enter__(self) -> 'CalculationIndex':
+    return self
+
+  def __exit__(self, *exc) -> None:
+    self.close()
+
+  @staticmethod
+  def walk(root: str):
+    """The folders below `root` containing a vaspout.h5"""
+    for folder, _, files in os.walk(root):
+      if H5Reader.FILENAME in files:
+        yield os.path.abspath(folder)
+
+  def changed(self, folders: list) -> dict:
+    """{folder: (mtime_ns, size, hash)} of the folders to read again
+
+    A file with a new mtime/size but the same content only gets its
+    mtime/size updated.
+    """
+    changed = {}
+    for folder in folders:
+      mtime_ns, size = file_signature(H5Reader(folder).path)
+      row = self.connection.execute(
+        'SELECT mtime_ns, size, hash FROM calculations WHERE folder = ?', (folder,)
+      ).fetchone()
+      if row and (row['mtime_ns'], row['size']) == (mtime_ns, size):
+        continue
+      digest = file_hash(H5Reader(folder).path)
+      if row and row['hash'] == digest:
+        with self.connection:
+          self.connection.execute(
+            'UPDATE calculations SET mtime_ns = ?, size = ? WHERE folder = ?',
+            (mtime_ns, size, folder)
+          )
+        continue
+      changed[folder] = (mtime_ns, size, digest)
+    return changed
+
+  def update(self, root: str, prune: bool = True) -> int:
+    """Index the new and changed calculations below `root`
+
+    Parameters
+    ----------
+    root : str
+      the folder searched recursively for vaspout.h5
+    prune : bool
+      drop indexed calculations below `root` that no longer exist
+
+    Returns
+    -------
+    int
+      the number of calculations read
+    """
+    folders = list(self.walk(root))
+    changed = self.changed(folders)
+    with ThreadPoolExecutor(self.max_workers) as pool:
+      rows = dict(zip(changed, pool.map(index_folder, changed)))
+
+    with self.connection:
+      for folder, row in rows.items():
+        self.connection.execute('DELETE FROM calculations WHERE folder = ?', (folder,))
+        self.connection.execute(
+          'INSERT INTO calculations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+          (folder, *changed[folder], row['system'],
+           *(row[name] for name in ('energy', 'gap', 'total_moment', 'volume')),
+           json.dumps(row['incar']))
+        )
+        self.connection.executemany(
+          'INSERT INTO incar VALUES (?, ?, ?)',
+          [(folder, tag, value) for tag, value in row['incar'].items()]
+        )
+      if prune:
+        prefix = os.path.join(os.path.abspath(root), '')
+        found = set(folders)
+        # not LIKE, '_' and '%' are common in folder names
+        self.connection.executemany(
+          'DELETE FROM calculations WHERE folder = ?',
+          [
+            (folder,) for (folder,) in self.connection.execute(
+              'SELECT folder FROM calculations'
+            ).fetchall()
+            if folder.startswith(prefix) and folder not in found
+          ]
+        )
+    return len(rows)
+
+  def rows(self, where: str = None, params: tuple = (), incar: dict = None) -> list:
+    """The rows of the calculations matching `where` and the INCAR tags
+
+    Parameters
+    ----------
+    where : str, optional
+      a SQL condition on the columns folder, system, energy, gap,
+      total_moment and volume, with ? for `params`
+    params : tuple
+      the values of the ? in `where`
+    incar : dict, optional
+      {TAG: value} the INCAR must contain, spaces of the value normalized
+    """
+    conditions, values = [], []
+    if where:
+      conditions.append(f"({where})")
+      values.extend(params)
+    for tag, value in (incar or {}).items():
+      conditions.append(
+        'folder IN (SELECT folder FROM incar WHERE tag = ? AND value = ?)'
+      )
+      values.extend((tag.upper(), ' '.join(str(value).split())))
+    sql = 'SELECT * FROM calculations'
+    if conditions:
+      sql += ' WHERE ' + ' AND '.join(conditions)
+    return self.connection.execute(sql + ' ORDER BY folder', values).fetchall()
+
+  def query(self, where: str = None, params: tuple = (), incar: dict = None) -> list:
+    """Like `rows`, but a Result for every matching folder"""
+    return [Result(row['folder']) for row in self.rows(where, params, incar)]
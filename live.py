@@ -0,0 +1,245 @@
+"""Follow a running calculation and push new ionic steps to an open figure
+
+`ConvergenceFigure` draws the same kind of subplots for a finished run.
+
+Example
+-------
+>>> from vasp_h5 import Result
+>>> r = Result("/path/to/running/calculation")
+>>> r.watch(interval=10)
+>>> r.convergence_figure().plot()
+"""
+
+import json
+
+import numpy as np
+import plotly
+from plotly.subplots import make_subplots
+
+from plotly_object import PlotlyFigure
+from reader import H5Reader
+
+
+def energy_column(tags: list) -> int:
+  """Index of the free energy TOTEN among the energy tags, 0 if missing"""
+  for index, tag in enumerate(tags):
+    if 'TOTEN' in tag:
+      return index
+  return 0
+
+
+def max_forces(forces: np.ndarray) -> np.ndarray:
+  """Largest force on any atom per step, (step x atom x 3) -> (step)"""
+  return np.linalg.norm(forces, axis=-1).max(axis=-1)
+
+
+def total_moments(spin_moments: np.ndarray) -> np.ndarray:
+  """Total magnetic moment per step, signed if collinear, its length if not
+
+  (step x component x atom x orbital) -> (step), the component 0 is the
+  charge, the others are the collinear or noncollinear moments.
+  """
+  moments = spin_moments[:, 1:].sum(axis=(-2, -1))
+  if moments.shape[-1] == 1:
+    return moments[:, 0]
+  return np.linalg.norm(moments, axis=-1)
+
+
+class StepWatcher:
+  """Read the ionic steps appended to vaspout.h5 since the last poll
+
+  Parameters
+  ----------
+  reader : H5Reader
+    the reader of the vaspout.h5 being written
+
+  Attributes
+  ----------
+  number_steps : int
+    the number of steps read so far
+  """
+  def __init__(self, reader: H5Reader) -> None:
+    self.reader = reader
+    self.number_steps = 0
+
+  def poll(self) -> dict:
+    """The new steps as {'step', 'energy', 'max_force', 'total_moment'}
+
+    Only the new steps are read. Return None if there is no new step or
+    the file can't be read at the moment, e.g. while it is created.
+    """
+    try:
+      with self.reader.open() as file:
+        energies = file[self.reader.key(file, 'energies')]
+        forces = file[self.reader.key(file, 'forces')]
+        # a step counts once all its datasets are written
+        available = min(len(energies), len(forces))
+        if available <= self.number_steps:
+          return None
+        steps = slice(self.number_steps, available)
+        tags = [
+          tag.decode() if isinstance(tag, bytes) else str(tag)
+          for tag in file[self.reader.key(file, 'energy_tags')][()]
+        ]
+        new = {
+          'step': np.arange(steps.start, steps.stop) + 1,
+          'energy': energies[steps, energy_column(tags)],
+          'max_force': max_forces(forces[steps]),
+        }
+        moments = self.reader.key(file, 'spin_moments')
+        if moments is not None and len(file[moments]) >= available:
+          new['total_moment'] = total_moments(file[moments][steps])
+    except (OSError, KeyError, TypeError):
+      return None
+    self.number_steps = available
+    return new
+
+
+class LiveFigure(PlotlyFigure):
+  """Energy, max force and total moment per ionic step as linked subplots
+
+  After `plot()` the page stays open, `push(new)` appends steps to it with
+  `Plotly.extendTraces` without reloading.
+
+  Parameters
+  ----------
+  data : dict
+    {'step', 'energy', 'max_force', 'total_moment'}, e.g. the first
+    `StepWatcher.poll()`
+  """
+  QUANTITIES = {
+    'energy': 'Energy (eV)',
+    'max_force': 'Max force (eV/Å)',
+    'total_moment': 'Total moment (μB)',
+  }
+
+  def __init__(
+    self,
+    data: dict = None,
+    width: float = 900, height: float = 900,
+    use_browser: str = 'chrome', mathjax_path: str = None
+  ) -> None:
+    super().__init__(
+      data or {},
+      width, height,
+      bgcolor = 'white', title = 'Ionic steps',
+      use_browser = use_browser, mathjax_path = mathjax_path
+    )
+    self.file.name = 'live-plot'
+    # the page is only watched, no image is downloaded
+    self.file.fmt = None
+    self.line.width = 2
+    # seconds between reloads of a page not driven by selenium, which 
+    # `push` rewrites instead of extending
+    self.reload_interval = 10
+
+  def create_figure(self):
+    self.figure = make_subplots(
+      rows = len(self.QUANTITIES), cols = 1, shared_xaxes = True,
+      vertical_spacing = 0.04,
+    )
+    self.colorscale.init()
+    steps = self.data.get('step', [])
+    for row, (name, title) in enumerate(self.QUANTITIES.items(), start=1):
+      self.figure.add_trace(
+        plotly.graph_objs.Scatter(
+          x = steps, y = self.data.get(name, []), name = name,
+          mode = 'lines+markers',
+          line = {'width': self.line.width, 'color': self.colorscale.next},
+        ),
+        row = row, col = 1,
+      )
+      self.figure.update_yaxes(title_text = title, row = row, col = 1)
+    self.figure.update_xaxes(title_text = 'Ionic step', row = row, col = 1)
+    self.figure.layout.plot_bgcolor = self.bgcolor
+    self.figure.layout.title.text = self.title
+    self.figure.layout.showlegend = False
+
+  def plot(self):
+    super().plot()
+    if not self.browsers and self.reload_interval:
+      # the opened page reloads itself from the file `push` rewrites
+      self.rewrite()
+
+  def rewrite(self) -> None:
+    """Write the page of the last `plot()` again, without opening it
+
+    The page reloads itself every `reload_interval` seconds.
+    """
+    if not self.html_paths:
+      self.plot()
+      return
+    self.create_figure()
+    plotly.io.write_html(
+      self.figure,
+      file = self.html_paths[-1],
+      include_plotlyjs = True,
+      include_mathjax = self.mathjax_path,
+      post_script = (
+        f"setTimeout(function () {{ location.reload(); }}, {1000 * self.reload_interval});"
+        if self.reload_interval else None
+      ),
+    )
+
+  def push(self, new: dict) -> None:
+    """Append the steps of `new` to the open page
+
+    Without a browser controlled by selenium, the file of the page is 
+    written again and the page picks it up on its next reload.
+    """
+    for name in ('step', *self.QUANTITIES):
+      if name in new:
+        self.data[name] = np.append(self.data.get(name, []), new[name])
+    if not self.browsers:
+      self.rewrite()
+      return
+    indices = [
+      index for index, name in enumerate(self.QUANTITIES) if name in new
+    ]
+    update = {
+      'x': [np.asarray(new['step']).tolist() for _ in indices],
+      'y': [np.asarray(new[name]).tolist() for name in self.QUANTITIES if name in new],
+    }
+    self.browsers[-1].execute_js(
+      "Plotly.extendTraces("
+      "document.getElementsByClassName('plotly-graph-div')[0], %s, %s);"
+      % (json.dumps(update), json.dumps(indices))
+    )
+
+
+class ConvergenceFigure(LiveFigure):
+  """Energy, max force, pressure and total moment per ionic step
+
+  Parameters
+  ----------
+  data : dict
+    {'step', 'energy', 'max_force', 'pressure', 'total_moment'}, e.g. 
+    `Trajectory.derived()`, see `from_trajectory`
+  """
+  QUANTITIES = {
+    'energy': 'Energy (eV)',
+    'max_force': 'Max force (eV/Å)',
+    'pressure': 'Pressure (kB)',
+    'total_moment': 'Total moment (μB)',
+  }
+
+  def __init__(
+    self,
+    data: dict = None,
+    width: float = 900, height: float = 1200,
+    use_browser: str = 'chrome', mathjax_path: str = None
+  ) -> None:
+    super().__init__(data, width, height, use_browser, mathjax_path)
+    self.title = 'Convergence'
+    self.file.name = 'convergence-plot'
+    self.file.fmt = 'png'
+    # a finished run, the page isn't reloaded
+    self.reload_interval = None
+
+  @classmethod
+  def from_trajectory(cls, trajectory, **kwargs) -> 'ConvergenceFigure':
+    """All subplots from one batched read of `trajectory` (a Trajectory)"""
+    data = dict(trajectory.derived())
+    # ionic steps are counted from 1 like in the live figure
+    data['step'] = data['step'] + 1
+    return cls(data, **kwargs)
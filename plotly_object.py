@@ -1,8 +1,9 @@
 from collections import namedtuple
 
-import os, time
+import base64, json, os, time, webbrowser
 from typing import Any
 
+import numpy as np
 import plotly
 
 from browser import Browser
@@ -318,12 +319,104 @@ class Line(PaintElement):
 
 
 class FigureFile:
+  """
+  Attributes
+  ==========
+  name : str
+    the image filename without extension
+  fmt : str
+    the image format, e.g. 'png', 'svg', None won't download image
+  encoding : str
+    how trace arrays are stored in the html file
+    - None, decimal JSON written by `plotly.offline.plot`
+    - 'base64', x/y/width arrays as base64 typed arrays (float32 where 
+      precision allows), decoded by the page before `Plotly.newPlot`
+  """
   def __init__(
     self, 
-    name: str = None, fmt: str = None
+    name: str = None, fmt: str = None, encoding: str = None
   ) -> None:
     self.name = name
     self.fmt = fmt
+    self.encoding = encoding
+
+
+# Wrap Plotly.newPlot so that {dtype, bdata} arrays become typed arrays
+_TYPED_ARRAY_DECODER = """
+(function () {
+  var types = {
+    i1: Int8Array, u1: Uint8Array, i2: Int16Array, u2: Uint16Array, 
+    i4: Int32Array, u4: Uint32Array, f4: Float32Array, f8: Float64Array
+  };
+  function decode(spec) {
+    var raw = window.atob(spec.bdata);
+    var bytes = new Uint8Array(raw.length);
+    for (var i = 0; i < raw.length; i++) { bytes[i] = raw.charCodeAt(i); }
+    return new types[spec.dtype](bytes.buffer);
+  }
+  function walk(obj) {
+    for (var key in obj) {
+      var value = obj[key];
+      if (value && typeof value === 'object') {
+        // n-dimensional arrays (shape 'n, m') are left to plotly.js
+        if ('bdata' in value && 'dtype' in value) {
+          if (!value.shape || String(value.shape).indexOf(',') < 0) { obj[key] = decode(value); }
+        }
+        else { walk(value); }
+      }
+    }
+  }
+  var newPlot = Plotly.newPlot;
+  Plotly.newPlot = function (gd, data, layout, config) {
+    walk(data);
+    return newPlot.call(Plotly, gd, data, layout, config);
+  };
+})();
+"""
+
+_IMAGE_DOWNLOAD_SCRIPT = """
+Plotly.downloadImage(document.getElementById('{plot_id}'), %s);
+"""
+
+
+# the dtypes of plotly typed arrays, all decoded by _TYPED_ARRAY_DECODER
+TYPED_ARRAY_DTYPES = ('i1', 'u1', 'i2', 'u2', 'i4', 'u4', 'f4', 'f8')
+
+
+def _decode_array(spec: dict) -> np.ndarray:
+  """The array of a `{'dtype', 'bdata', 'shape'}` typed array"""
+  array = np.frombuffer(base64.b64decode(spec['bdata']), dtype=f"<{spec['dtype']}")
+  if spec.get('shape'):
+    array = array.reshape([int(size) for size in str(spec['shape']).split(',')])
+  return array
+
+
+def _encode_array(values, rtol: float = 1e-6):
+  """Encode a numeric array as `{'dtype': 'f4'|'f8', 'bdata': base64}`
+
+  Typed arrays already encoded by plotly (>= 6) are kept, except 
+  one-dimensional float64 ones, which are downcast like plain arrays.
+  Return None if `values` is not numeric, e.g. category names.
+  """
+  if isinstance(values, dict):
+    if values.get('dtype') not in TYPED_ARRAY_DTYPES or 'bdata' not in values:
+      return None
+    if values['dtype'] != 'f8' or ',' in str(values.get('shape', '')):
+      return values
+    values = _decode_array(values)
+  try:
+    array = np.asarray(values, dtype=float)
+  except (TypeError, ValueError):
+    return None
+  single = array.astype(np.float32)
+  if np.allclose(single, array, rtol=rtol, atol=0, equal_nan=True):
+    array, dtype = single.astype('<f4'), 'f4'
+  else:
+    array, dtype = array.astype('<f8'), 'f8'
+  return {
+    'dtype': dtype, 
+    'bdata': base64.b64encode(array.tobytes()).decode('ascii'), 
+  }
 
 
 class PlotlyFigure:
@@ -415,6 +508,99 @@ class PlotlyFigure:
       to self.figure attribute
     """)
 
+  def merge_traces(self, key: str = 'name'):
+    """Concatenate the traces sharing the same `key` into one trace
+
+    The traces are joined with NaN separators, so a line breaks between 
+    two of them and every `fill='toself'` polygon is still filled on its 
+    own. The figure looks the same while the number of traces drops to 
+    the number of distinct `key`, e.g. one per projection/spin.
+
+    Parameters
+    ----------
+    key : str
+      the trace property used to group the traces, 'name' by default
+    """
+    groups = {}
+    for scatter in self.figure.data:
+      groups.setdefault(scatter[key], []).append(scatter)
+
+    merged = []
+    for scatters in groups.values():
+      head = scatters[0]
+      if len(scatters) > 1:
+        for axis in ('x', 'y'):
+          head[axis] = np.concatenate([
+            np.append(np.asarray(scatter[axis], dtype=float), np.nan)
+            for scatter in scatters
+          ])[:-1]
+        head.showlegend = True
+      merged.append(head)
+    self.figure.data = tuple(merged)
+
+  def prune_traces(
+    self, 
+    axis: str = 'y', window: tuple = (None, None), margin: float = 0, 
+    pointwise: bool = False
+  ):
+    """Drop the data lying fully outside `window` (widened by `margin`)
+
+    By default a trace is split at its NaN separators and every segment, 
+    e.g. a band or a fat-band polygon, whose minimum and maximum along 
+    `axis` both fall on one side of the window is removed together with 
+    its separator. Traces left empty are removed and the legend entry is 
+    moved to the first remaining trace of the same name.
+
+    Parameters
+    ----------
+    axis : str
+      'x' or 'y', the axis the window applies to
+    window : tuple
+      (min, max), None means unbounded
+    margin : float
+      extra range kept on both sides of the window
+    pointwise : bool
+      - False, drop whole segments, which suits bands
+      - True, drop single points, which suits DoS on an energy grid, 
+        traces are never removed in this mode
+    """
+    lower, upper = window
+    lower = -np.inf if lower is None else lower - margin
+    upper = np.inf if upper is None else upper + margin
+    if np.isinf(lower) and np.isinf(upper):
+      return
+
+    other = 'x' if axis == 'y' else 'y'
+    kept = []
+    for scatter in self.figure.data:
+      values = np.asarray(scatter[axis], dtype=float)
+      gaps = np.isnan(values)
+      if pointwise:
+        keep = gaps | ((lower <= values) & (values <= upper))
+      else:
+        # a separator carries the id of the segment that follows it
+        segment = np.cumsum(gaps)
+        mins = np.full(segment[-1] + 1 if len(segment) else 0, np.inf)
+        maxs = np.full_like(mins, -np.inf)
+        np.minimum.at(mins, segment[~gaps], values[~gaps])
+        np.maximum.at(maxs, segment[~gaps], values[~gaps])
+        keep = ((maxs >= lower) & (mins <= upper))[segment]
+      if keep.all():
+        kept.append(scatter)
+        continue
+      scatter[axis] = values[keep]
+      scatter[other] = np.asarray(scatter[other])[keep]
+      if pointwise or (~np.isnan(scatter[axis])).any():
+        kept.append(scatter)
+
+    if len(kept) < len(self.figure.data):
+      names = set()
+      for scatter in kept:
+        if scatter.showlegend is False and scatter.name not in names:
+          scatter.showlegend = True
+        names.add(scatter.name)
+      self.figure.data = tuple(kept)
+
   def show(self):
     self.create_figure()
     self.figure.show()
@@ -439,23 +625,72 @@ class PlotlyFigure:
     
     html_filename = f"temp-plot_{id(self.figure)}.html"
     # print(html_filename)
-    plotly.offline.plot(
-      figure_or_data  = self.figure, 
-      filename        = html_filename, 
-      image_filename  = self.file.name,
-      image           = self.file.fmt, 
-      image_width     = self.width, 
-      image_height    = self.height,
-      auto_open       = auto_open, 
-      include_mathjax = self.mathjax_path
-    )
-
     html_path = os.path.abspath(html_filename)
+    if self.file.encoding == 'base64':
+      self.write_base64_html(html_filename)
+      if auto_open:
+        webbrowser.open(f"file://{html_path}")
+    else:
+      plotly.offline.plot(
+        figure_or_data  = self.figure, 
+        filename        = html_filename, 
+        image_filename  = self.file.name,
+        image           = self.file.fmt, 
+        image_width     = self.width, 
+        image_height    = self.height,
+        auto_open       = auto_open, 
+        include_mathjax = self.mathjax_path
+      )
+
     self.html_paths.append(html_path)
 
     if not auto_open:
       browser.get(html_path)
 
+  def write_base64_html(self, filename: str):
+    """Write the figure as html with x/y/width stored as typed arrays
+
+    Works like `plotly.offline.plot(auto_open=False)`, including the image 
+    download, but the trace arrays are base64 strings instead of decimal 
+    JSON, which makes the file smaller and faster to load.
+    """
+    fig_dict = self.figure.to_dict()
+    for trace in fig_dict['data']:
+      for key in ('x', 'y', 'width'):
+        if trace.get(key) is None:
+          continue
+        encoded = _encode_array(trace[key])
+        if encoded:
+          trace[key] = encoded
+
+    post_script = None
+    if self.file.fmt:
+      options = {
+        'format': self.file.fmt, 
+        'width': self.width, 
+        'height': self.height, 
+        'filename': self.file.name, 
+      }
+      post_script = _IMAGE_DOWNLOAD_SCRIPT % json.dumps({
+        key: value for key, value in options.items() if value is not None
+      })
+
+    div = plotly.io.to_html(
+      fig_dict, 
+      include_plotlyjs = False, 
+      full_html        = False, 
+      include_mathjax  = self.mathjax_path, 
+      post_script      = post_script, 
+      validate         = False, 
+    )
+    with open(filename, 'w', encoding='utf-8') as file:
+      file.write(
+        '<html>\n<head><meta charset="utf-8" /></head>\n<body>\n'
+        f'<script type="text/javascript">{plotly.offline.get_plotlyjs()}</script>\n'
+        f'<script type="text/javascript">{_TYPED_ARRAY_DECODER}</script>\n'
+        f'{div}\n</body>\n</html>'
+      )
+
   def ishow(self):
     self.create_figure()
     # https://github.com/plotly/plotly.py/issues/515
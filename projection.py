@@ -0,0 +1,416 @@
+"""Projections onto atoms and orbitals, summed with cached partial sums
+
+The projection tensor (spin x atom x orbital x ...) is loaded once, the
+sums over the atoms of each element and over the orbitals of each angular
+momentum are precomputed, so a selection string such as
+`'up(V(dxy, dyz, dxz, dz2, dx2y2))'` becomes a few small vectorized sums.
+Selections are compiled to index arrays once and cached by their
+normalized spelling.
+"""
+
+import re
+from collections import namedtuple
+
+import numpy as np
+
+
+SPINS = ('up', 'down', 'total')
+
+# the level of detail kept along the atom/orbital axis of a partial sum
+ATOM, ELEMENT = 'atom', 'element'
+ORBITAL, MOMENTUM = 'orbital', 'momentum'
+
+
+class SelectionError(Exception):
+  pass
+
+
+Projection = namedtuple(
+  typename='Projection',
+  field_names=['label', 'spins', 'atom_level', 'atoms', 'orbital_level', 'orbitals'],
+)
+Projection.__doc__ = """One projection of a selection, resolved to indices
+
+`atoms` index the atom axis of the `atom_level` partial sum, i.e. atoms
+or elements, `orbitals` the orbital axis of the `orbital_level` one, i.e.
+orbitals or angular momenta.
+"""
+
+
+def _tokenize(selection: str) -> list:
+  return re.findall(r'[(),]|[^\s(),]+', selection or '')
+
+
+def normalize_selection(selection: str) -> str:
+  """Canonical spelling of a selection, used as the key of compiled ones
+
+  Examples
+  --------
+  >>> normalize_selection(' up( V (dxy,dyz))  S')
+  'up(V(dxy, dyz)), S'
+
+  Raises
+  ------
+  SelectionError
+    if a group has no name before it, e.g. 'V, (d)'
+  """
+  normalized = ''
+  last = None
+  for token in _tokenize(selection):
+    if token == '(' and last in (None, ',', '('):
+      raise SelectionError(f"'(' must follow a name, got {selection!r}")
+    last = token
+    if token == ',':
+      continue
+    if token not in '()' and normalized and normalized[-1] not in '(':
+      normalized += ', '
+    normalized += token
+  return normalized
+
+
+def parse_selection(selection: str) -> list:
+  """Split a selection string into the token paths of its leaves
+
+  Examples
+  --------
+  >>> parse_selection('up(V(dxy, dyz)), S')
+  [('up', 'V', 'dxy'), ('up', 'V', 'dyz'), ('S',)]
+  """
+  tokens = _tokenize(selection)
+  paths, position = _parse_tokens(tokens, 0, ())
+  if position < len(tokens):
+    raise SelectionError(f"Unmatched ')' in selection {selection!r}")
+  return paths
+
+
+def _parse_tokens(tokens: list, position: int, prefix: tuple) -> tuple:
+  paths, last = [], None
+  while position < len(tokens):
+    token = tokens[position]
+    if token == '(':
+      if last is None:
+        raise SelectionError(f"'(' must follow a name, got {tokens!r}")
+      children, position = _parse_tokens(tokens, position + 1, prefix + (last,))
+      if children:
+        paths.pop()
+        paths.extend(children)
+      last = None
+      continue
+    if token == ')':
+      if not prefix:
+        return paths, position
+      return paths, position + 1
+    if token != ',':
+      last = token
+      paths.append(prefix + (token,))
+    else:
+      last = None
+    position += 1
+  if prefix:
+    raise SelectionError(f"Unmatched '(' in selection {tokens!r}")
+  return paths, position
+
+
+class CompiledSelection:
+  """A selection resolved to index arrays into the partial sums
+
+  It only depends on the layout (elements, orbitals, spins) of a tensor,
+  so it is reused by every tensor with the same layout, e.g. band and DoS
+  of one calculation or many calculations of the same structure.
+
+  Examples
+  --------
+  >>> compiled = tensor.compile('up(V(dxy, dyz))')
+  >>> compiled.labels
+  ['V_dxy_up', 'V_dyz_up']
+  >>> compiled(tensor)
+  {'V_dxy_up': array(...), 'V_dyz_up': array(...)}
+  """
+  def __init__(self, selection: str, layout: 'ProjectionLayout', projections: list) -> None:
+    self.selection = selection
+    self.layout = layout
+    self.projections = projections
+
+  def __repr__(self) -> str:
+    return f"{self.__class__.__name__}({self.selection!r})"
+
+  @property
+  def labels(self) -> list:
+    return [projection.label for projection in self.projections]
+
+  def needed(self) -> tuple:
+    """Sorted (spins, atoms, orbitals) of the tensor used by any projection
+    """
+    indices = [self.layout.indices(projection) for projection in self.projections]
+    return tuple(
+      np.unique(np.concatenate([index[axis] for index in indices]))
+      for axis in range(3)
+    )
+
+  def sum_block(self, block: np.ndarray, needed: tuple) -> dict:
+    """Project from a block holding only the `needed` part of the tensor
+
+    Parameters
+    ----------
+    block : np.ndarray
+      the tensor indexed by `needed` along its first three axes
+    needed : tuple
+      (spins, atoms, orbitals), see `needed()`
+    """
+    projected = {}
+    for projection in self.projections:
+      index = np.ix_(*(
+        np.searchsorted(axis, indices)
+        for axis, indices in zip(needed, self.layout.indices(projection))
+      ))
+      projected[projection.label] = block[index].sum(axis=(0, 1, 2))
+    return projected
+
+  def __call__(self, tensor, trailing: tuple = ()) -> dict:
+    if tensor.layout != self.layout:
+      raise SelectionError(
+        f"{self!r} was compiled for another set of atoms/orbitals/spins"
+      )
+    return {
+      projection.label: tensor.sum(projection, trailing)
+      for projection in self.projections
+    }
+
+
+# {(normalized selection, ProjectionLayout): CompiledSelection}, oldest dropped first
+_COMPILED = {}
+COMPILED_CACHE_SIZE = 1024
+
+
+def orbital_name(lchar: str) -> str:
+  """Name of an orbital as used in selections, e.g. 'x2-y2' -> 'dx2y2'"""
+  name = lchar.strip()
+  return 'dx2y2' if name == 'x2-y2' else name
+
+
+class ProjectionLayout:
+  """The atoms, orbitals and spins along the first axes of projections
+
+  Selections are resolved against a layout only, so they are shared by
+  every tensor with the same layout and can be resolved before (or
+  without) reading the projections.
+
+  Parameters
+  ----------
+  elements : list
+    the element of every atom, e.g. `Result.topology_elements`
+  orbitals : list
+    the name of every orbital, e.g. ['s', 'py', 'pz', 'px', ...]
+  number_spins : int
+    the length of the spin axis
+  """
+  def __init__(self, elements: list, orbitals: list, number_spins: int) -> None:
+    self.elements = list(elements)
+    self.orbitals = [orbital_name(orbital) for orbital in orbitals]
+    self.number_spins = number_spins
+    self.element_names = list(dict.fromkeys(self.elements))
+    self.momenta = list(dict.fromkeys(name[0] for name in self.orbitals))
+    self.key = (tuple(self.elements), tuple(self.orbitals), self.number_spins)
+
+  def __repr__(self) -> str:
+    return "%s(elements=%s, orbitals=%s, number_spins=%s)" % (
+      self.__class__.__name__,
+      self.element_names,
+      self.orbitals,
+      self.number_spins,
+    )
+
+  def __eq__(self, other) -> bool:
+    return isinstance(other, ProjectionLayout) and self.key == other.key
+
+  def __hash__(self) -> int:
+    return hash(self.key)
+
+  @property
+  def is_spin_polarized(self) -> bool:
+    return self.number_spins == 2
+
+  def grouping(self, dtype=float) -> tuple:
+    """One-hot matrices (element x atom) and (momentum x orbital)"""
+    by_element = np.array([
+      [element == name for element in self.elements]
+      for name in self.element_names
+    ], dtype=dtype)
+    by_momentum = np.array([
+      [orbital[0] == momentum for orbital in self.orbitals]
+      for momentum in self.momenta
+    ], dtype=dtype)
+    return by_element, by_momentum
+
+  def _spins(self, spin: str) -> list:
+    """[(spin indices, label suffix)] for a spin token or None"""
+    if spin is None:
+      if self.is_spin_polarized:
+        return [([0], 'up'), ([1], 'down')]
+      return [([0], None)]
+    if spin == 'total':
+      return [([0, 1] if self.is_spin_polarized else [0], spin)]
+    if not self.is_spin_polarized:
+      raise SelectionError(f"Spin {spin!r} selected but the calculation is not spin polarized")
+    return [([SPINS.index(spin)], spin)]
+
+  def _atoms(self, atom: str) -> tuple:
+    if atom is None:
+      return ELEMENT, np.arange(len(self.element_names))
+    if atom in self.element_names:
+      return ELEMENT, np.array([self.element_names.index(atom)])
+    match = re.fullmatch(r'(\d+)(?::(\d+))?', atom)
+    if not match:
+      raise SelectionError(f"Unknown atom, orbital or spin {atom!r}")
+    start, stop = int(match[1]), int(match[2] or match[1])
+    if not 1 <= start <= stop <= len(self.elements):
+      raise SelectionError(f"Atom index {atom!r} out of range 1:{len(self.elements)}")
+    return ATOM, np.arange(start - 1, stop)
+
+  def _orbitals(self, orbital: str) -> tuple:
+    if orbital is None:
+      return MOMENTUM, np.arange(len(self.momenta))
+    if orbital in self.momenta:
+      return MOMENTUM, np.array([self.momenta.index(orbital)])
+    return ORBITAL, np.array([self.orbitals.index(orbital)])
+
+  def resolve(self, path: tuple) -> list:
+    """Resolve the tokens of one selection leaf to a list of Projection"""
+    atom = orbital = spin = None
+    for token in path:
+      if token in SPINS:
+        spin = token
+      elif token in self.orbitals or token in self.momenta:
+        orbital = token
+      else:
+        atom = token
+    atom_level, atoms = self._atoms(atom)
+    orbital_level, orbitals = self._orbitals(orbital)
+    # shared through the cache of compiled selections
+    atoms.flags.writeable = orbitals.flags.writeable = False
+    return [
+      Projection(
+        label = '_'.join(part for part in (atom, orbital, suffix) if part) or 'total',
+        spins = np.array(spins),
+        atom_level = atom_level, atoms = atoms,
+        orbital_level = orbital_level, orbitals = orbitals,
+      )
+      for spins, suffix in self._spins(spin)
+    ]
+
+  def indices(self, projection: Projection) -> tuple:
+    """(spins, atoms, orbitals) of `projection` as indices into the tensor"""
+    atoms, orbitals = projection.atoms, projection.orbitals
+    if projection.atom_level == ELEMENT:
+      names = [self.element_names[index] for index in atoms]
+      atoms = np.flatnonzero(np.isin(self.elements, names))
+    if projection.orbital_level == MOMENTUM:
+      momenta = [self.momenta[index] for index in orbitals]
+      orbitals = np.flatnonzero([name[0] in momenta for name in self.orbitals])
+    return projection.spins, atoms, orbitals
+
+  def compile(self, selection: str) -> CompiledSelection:
+    """Parse and resolve `selection` once, cached by its normalized form
+
+    Later calls with the same selection, spelled in any way, for any 
+    tensor with the same layout skip parsing and index resolution.
+    """
+    key = (normalize_selection(selection), self)
+    compiled = _COMPILED.get(key)
+    if compiled is None:
+      compiled = CompiledSelection(key[0], self, [
+        projection
+        for path in parse_selection(key[0])
+        for projection in self.resolve(path)
+      ])
+      if len(_COMPILED) >= COMPILED_CACHE_SIZE:
+        _COMPILED.pop(next(iter(_COMPILED)))
+      _COMPILED[key] = compiled
+    return compiled
+
+
+class ProjectionTensor:
+  """Projections (spin x atom x orbital x ...) with cached partial sums
+
+  Parameters
+  ----------
+  tensor : np.ndarray
+    the projections with shape (spin, atom, orbital, ...), e.g.
+    (spin, atom, orbital, kpoint, band) for bands or
+    (spin, atom, orbital, energy) for DoS
+  elements : list
+    the element of every atom, e.g. `Result.topology_elements`
+  orbitals : list
+    the name of every orbital, e.g. ['s', 'py', 'pz', 'px', ...]
+
+  Attributes
+  ----------
+  layout : ProjectionLayout
+    the atoms, orbitals and spins, what a compiled selection depends on
+  sums : dict
+    {(atom_level, orbital_level): np.ndarray}, the tensor and its partial
+    sums over the atoms of each element and/or over the orbitals of each
+    angular momentum
+  """
+  def __init__(self, tensor: np.ndarray, elements: list, orbitals: list) -> None:
+    tensor = np.asarray(tensor)
+    self.layout = ProjectionLayout(elements, orbitals, tensor.shape[0])
+
+    by_element, by_momentum = self.layout.grouping(tensor.dtype)
+    element_sums = np.moveaxis(np.tensordot(tensor, by_element, axes=([1], [1])), -1, 1)
+    self.sums = {
+      (ATOM, ORBITAL): tensor,
+      (ATOM, MOMENTUM): np.moveaxis(np.tensordot(tensor, by_momentum, axes=([2], [1])), -1, 2),
+      (ELEMENT, ORBITAL): element_sums,
+      (ELEMENT, MOMENTUM): np.moveaxis(np.tensordot(element_sums, by_momentum, axes=([2], [1])), -1, 2),
+    }
+
+  def __repr__(self) -> str:
+    return "%s(shape=%s, elements=%s, orbitals=%s)" % (
+      self.__class__.__name__,
+      self.shape,
+      self.layout.element_names,
+      self.layout.orbitals,
+    )
+
+  @property
+  def shape(self) -> tuple:
+    return self.sums[(ATOM, ORBITAL)].shape
+
+  @property
+  def is_spin_polarized(self) -> bool:
+    return self.layout.is_spin_polarized
+
+  def sum(self, projection: Projection, trailing: tuple = ()) -> np.ndarray:
+    """Sum the cached partial sum selected by `projection`
+
+    `trailing` are slices of the axes after the orbitals, e.g. a range of
+    bands, only those elements are summed.
+    """
+    array = self.sums[(projection.atom_level, projection.orbital_level)]
+    array = array[(slice(None),) * 3 + tuple(trailing)]
+    index = np.ix_(projection.spins, projection.atoms, projection.orbitals)
+    return array[index].sum(axis=(0, 1, 2))
+
+  def compile(self, selection: str) -> CompiledSelection:
+    """See `ProjectionLayout.compile`"""
+    return self.layout.compile(selection)
+
+  def project(self, selection: str, trailing: tuple = ()) -> dict:
+    """Project onto the atoms, orbitals and spins of `selection`
+
+    Parameters
+    ----------
+    selection : str
+      same syntax as `Result.projector_parse_selection`, e.g. 'Sr(s, p)'
+    trailing : tuple, optional
+      slices of the axes after the orbitals, e.g. `(slice(None), 
+      slice(10, 20))` for the bands 10 to 19
+
+    Returns
+    -------
+    dict
+      {label: np.ndarray}, the trailing axes of the tensor, e.g.
+      (kpoint, band) for bands
+    """
+    return self.compile(selection)(self, trailing)
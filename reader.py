@@ -0,0 +1,185 @@
+"""Direct access to the datasets of vaspout.h5
+
+py4vasp reads a whole quantity at once, the reader here reads only the
+datasets (or parts of them) that are needed. Files are opened in
+single-writer-multiple-reader (SWMR) mode when possible, so a file still
+written by VASP can be read consistently, and with a chunk cache large
+enough for the projection datasets.
+"""
+
+import os
+
+import h5py
+import numpy as np
+
+
+# dataset keys of vaspout.h5, see py4vasp/_raw/definition.py
+# a tuple lists the keys used by different VASP versions
+DATASETS = {
+  'band_projections' : 'results/projectors/par',
+  'dos_projections'  : 'results/electron_dos/dospar',
+  'orbital_types'    : 'results/projectors/lchar',
+  'energies'         : 'intermediate/ion_dynamics/energies',
+  'energy_tags'      : 'intermediate/ion_dynamics/energies_tags',
+  'forces'           : 'intermediate/ion_dynamics/forces',
+  'stress'           : 'intermediate/ion_dynamics/stress',
+  'positions'        : 'intermediate/ion_dynamics/position_ions',
+  'lattice_vectors'  : 'intermediate/ion_dynamics/lattice_vectors',
+  'scale'            : 'results/positions/scale',
+  'density'          : 'charge/charge',
+  'spin_moments'     : (
+    'intermediate/ion_dynamics/magnetism/spin_moments/values',
+    'intermediate/ion_dynamics/magnetism/spin_moments',
+  ),
+}
+
+
+# SWMR reading needs HDF5 >= 1.10
+SWMR_AVAILABLE = h5py.version.hdf5_version_tuple >= (1, 10)
+
+
+class H5Reader:
+  """Read datasets of one vaspout.h5 file
+
+  Parameters
+  ----------
+  path : str
+    the vaspout.h5 file or the folder containing it
+  swmr : bool, optional
+    open the file in SWMR mode, by default if HDF5 supports it, files not
+    written in SWMR mode are opened normally
+  cache_size : int
+    the HDF5 chunk cache per dataset in bytes (rdcc_nbytes), the default
+    of HDF5 (1 MiB) is too small for the projections
+  cache_slots : int
+    the number of chunk slots in the cache (rdcc_nslots), best a prime
+    about 100 times the number of chunks fitting in the cache
+
+  Attributes
+  ----------
+  bytes_read : int
+    the number of bytes read by `read`/`read_hyperslab` so far
+  """
+  FILENAME = 'vaspout.h5'
+
+  def __init__(
+    self,
+    path: str,
+    swmr: bool = None, cache_size: int = 64 * 2**20, cache_slots: int = 10007
+  ) -> None:
+    if os.path.isdir(path):
+      path = os.path.join(path, self.FILENAME)
+    self.path = path
+    self.swmr = SWMR_AVAILABLE if swmr is None else swmr
+    self.cache_size = cache_size
+    self.cache_slots = cache_slots
+    self.bytes_read = 0
+
+  def __repr__(self) -> str:
+    return f"{self.__class__.__name__}({self.path!r})"
+
+  def open(self) -> h5py.File:
+    options = {'rdcc_nbytes': self.cache_size, 'rdcc_nslots': self.cache_slots}
+    if self.swmr:
+      try:
+        return h5py.File(self.path, 'r', swmr=True, **options)
+      except (OSError, ValueError):
+        # not written in SWMR mode (older file format), don't try again
+        self.swmr = False
+    return h5py.File(self.path, 'r', **options)
+
+  @staticmethod
+  def key(file: h5py.File, name: str) -> str:
+    """The key of dataset `name` in `file`, None if it's missing"""
+    keys = DATASETS.get(name, name)
+    for key in (keys,) if isinstance(keys, str) else keys:
+      if key in file:
+        return key
+    return None
+
+  def exists(self, name: str) -> bool:
+    with self.open() as file:
+      return self.key(file, name) is not None
+
+  def shape(self, name: str) -> tuple:
+    """Shape of the dataset `name` without reading it"""
+    with self.open() as file:
+      return file[self.key(file, name)].shape
+
+  def dtype(self, name: str) -> np.dtype:
+    """Data type of the dataset `name` without reading it"""
+    with self.open() as file:
+      return file[self.key(file, name)].dtype
+
+  def read(self, name: str, index: tuple = ()) -> np.ndarray:
+    """Read the dataset `name` (a key of DATASETS or an h5 path)
+
+    Parameters
+    ----------
+    name : str
+      a key of `DATASETS` or the path of the dataset inside the file
+    index : tuple, optional
+      slices/indices, only this part of the dataset is read
+    """
+    with self.open() as file:
+      key = self.key(file, name)
+      if key is None:
+        raise KeyError(f"{name!r} not found in {self.path}")
+      data = file[key][index]
+    self.bytes_read += np.asarray(data).nbytes
+    return data
+
+  def read_hyperslab(self, name: str, indices: tuple, trailing: tuple = ()) -> np.ndarray:
+    """Read the elements `indices` of the leading axes, and `trailing`
+
+    Only the bounding hyperslab of `indices` is read from the file, e.g.
+    the atoms of one element and the d orbitals out of a projection
+    dataset, then the elements are picked from it.
+
+    Parameters
+    ----------
+    name : str
+      a key of `DATASETS` or the path of the dataset inside the file
+    indices : tuple
+      one sorted index array per leading axis
+    trailing : tuple, optional
+      slices of the remaining axes, e.g. a range of k-points
+
+    Returns
+    -------
+    np.ndarray
+      the dataset indexed by `np.ix_(*indices)` and `trailing`
+    """
+    bounds = tuple(
+      slice(int(np.min(index)), int(np.max(index)) + 1) for index in indices
+    )
+    block = self.read(name, bounds + tuple(trailing))
+    return block[np.ix_(*(
+      np.asarray(index) - bound.start for index, bound in zip(indices, bounds)
+    ))]
+
+  def memmap(self, name: str) -> np.ndarray:
+    """The dataset `name` mapped into memory, pages are read on access
+
+    Only contiguous, uncompressed datasets can be mapped, e.g. the density
+    written by VASP; other datasets are read completely.
+    """
+    with self.open() as file:
+      key = self.key(file, name)
+      if key is None:
+        raise KeyError(f"{name!r} not found in {self.path}")
+      dataset = file[key]
+      offset = dataset.id.get_offset()
+      if dataset.chunks is not None or offset is None or dataset.dtype.kind not in 'biuf':
+        data = dataset[()]
+        self.bytes_read += data.nbytes
+        return data
+      shape, dtype = dataset.shape, dataset.dtype
+    return np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+  def read_strings(self, name: str) -> list:
+    """Read a dataset of fixed length byte strings as a list of str"""
+    return [
+      item.decode().strip() if isinstance(item, bytes) else str(item).strip()
+      for item in self.read(name)
+    ]
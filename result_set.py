@@ -0,0 +1,189 @@
+"""The same quantities from many calculations, e.g. a sweep of U or strain
+
+Example
+-------
+>>> from result_set import ResultSet
+>>> results = ResultSet.from_glob(r"D:\\sweep\\*_U_*\\01-FM")
+>>> results.gaps, results.energies   # one array each, ordered like the folders
+>>> results.add(r"D:\\sweep\\100_U_5.00\\01-FM")  # reads only the new folder
+>>> results.frame()                  # pandas.DataFrame indexed by folder
+"""
+
+import glob, os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from py4vasp import Calculation
+
+from analysis import spin_band_edges
+from cache import file_signature
+from live import energy_column
+from reader import H5Reader
+from vasp_data import ProjectedBand
+from vasp_h5 import Result
+
+
+def final_energy(calc) -> float:
+  """The free energy TOTEN of the last ionic step"""
+  data = calc.energy.read()
+  names = list(data)
+  return float(np.ravel(data[names[energy_column(names)]])[-1])
+
+
+def band_gap(calc) -> float:
+  """The band gap over both spins, 0 for a metal"""
+  data = calc.band.read()
+  edges = spin_band_edges(
+    ProjectedBand.bands(data), data.get('kpoint_labels'),
+    occupations = ProjectedBand.occupations(data)
+  )
+  return edges.get('total', next(iter(edges.values()))).gap
+
+
+def total_moment(calc) -> float:
+  """The total magnetic moment, signed if collinear, its length if not"""
+  moments = np.asarray(calc.magnetism.total_moments(), dtype=float)
+  total = moments.sum(axis=0)
+  return float(total if np.ndim(total) == 0 else np.linalg.norm(total))
+
+
+def volume(calc) -> float:
+  return float(calc.structure.volume())
+
+
+# {name: function of py4vasp.Calculation}, module level so processes can use them
+EXTRACTS = {
+  'energy': final_energy,
+  'gap': band_gap,
+  'total_moment': total_moment,
+  'volume': volume,
+}
+
+
+def extract_folder(folder: str, names: tuple) -> dict:
+  """`EXTRACTS` of one folder, NaN for what it doesn't contain"""
+  calc = Calculation.from_path(folder)
+  values = {}
+  for name in names:
+    try:
+      values[name] = EXTRACTS[name](calc)
+    except Exception:
+      values[name] = np.nan
+  return values
+
+
+class ResultSet:
+  """Many calculations read in parallel, their quantities stacked in arrays
+
+  The quantities of `EXTRACTS` are read once per folder in a thread or
+  process pool and kept with the signature of its vaspout.h5, so adding a
+  folder or a rewritten vaspout.h5 only reads that folder again.
+
+  Parameters
+  ----------
+  folders : list
+    the folders of the calculations, in the order of the arrays
+  max_workers : int, optional
+    size of the pool, the default of `concurrent.futures`
+  executor : str
+    'thread' or 'process', processes avoid the GIL for large band
+    structures but need to be started under `if __name__ == '__main__':`
+  """
+  EXECUTORS = {'thread': ThreadPoolExecutor, 'process': ProcessPoolExecutor}
+
+  def __init__(
+    self,
+    folders: list = (),
+    max_workers: int = None, executor: str = 'thread'
+  ) -> None:
+    if executor not in self.EXECUTORS:
+      raise ValueError(f"Unknown executor {executor!r}, use one of {list(self.EXECUTORS)}")
+    self.folders = []
+    self.max_workers = max_workers
+    self.executor = executor
+    # {folder: (signature of vaspout.h5, {name: value})}
+    self._extracts = {}
+    self._results = {}
+    self.add(*folders)
+
+  @classmethod
+  def from_glob(cls, pattern: str, **kwargs) -> 'ResultSet':
+    """Every folder matching `pattern` that contains a vaspout.h5, sorted"""
+    return cls(
+      sorted(
+        folder for folder in glob.glob(pattern)
+        if os.path.isfile(H5Reader(folder).path)
+      ),
+      **kwargs
+    )
+
+  def __repr__(self) -> str:
+    return f"{self.__class__.__name__}({len(self)} folders)"
+
+  def __len__(self) -> int:
+    return len(self.folders)
+
+  def __getitem__(self, key) -> Result:
+    """The Result of a folder, by index or by folder, created once"""
+    folder = self.folders[key] if isinstance(key, int) else key
+    if folder not in self._results:
+      self._results[folder] = Result(folder)
+    return self._results[folder]
+
+  def __iter__(self):
+    return (self[folder] for folder in self.folders)
+
+  def add(self, *folders: str) -> None:
+    """Append folders and read only those not read before"""
+    self.folders.extend(
+      folder for folder in dict.fromkeys(folders) if folder not in self.folders
+    )
+    self.update()
+
+  def update(self) -> None:
+    """Read the folders that are new or whose vaspout.h5 changed"""
+    signatures = {
+      folder: file_signature(H5Reader(folder).path) for folder in self.folders
+    }
+    stale = [
+      folder for folder in self.folders
+      if self._extracts.get(folder, (None,))[0] != signatures[folder]
+    ]
+    if not stale:
+      return
+    names = tuple(EXTRACTS)
+    with self.EXECUTORS[self.executor](self.max_workers) as pool:
+      for folder, values in zip(stale, pool.map(extract_folder, stale, [names] * len(stale))):
+        self._extracts[folder] = (signatures[folder], values)
+
+  def stacked(self, name: str) -> np.ndarray:
+    """The quantity `name` of `EXTRACTS` of all folders as one array"""
+    self.update()
+    return np.array([self._extracts[folder][1][name] for folder in self.folders])
+
+  @property
+  def energies(self) -> np.ndarray:
+    return self.stacked('energy')
+
+  @property
+  def gaps(self) -> np.ndarray:
+    return self.stacked('gap')
+
+  @property
+  def moments(self) -> np.ndarray:
+    return self.stacked('total_moment')
+
+  @property
+  def volumes(self) -> np.ndarray:
+    return self.stacked('volume')
+
+  def frame(self):
+    """All quantities as a pandas.DataFrame indexed by folder"""
+    try:
+      import pandas
+    except ImportError as e:
+      raise ImportError("ResultSet.frame requires pandas, `pip install pandas`") from e
+    return pandas.DataFrame(
+      {name: self.stacked(name) for name in EXTRACTS},
+      index = pandas.Index(self.folders, name='folder'),
+    )
@@ -8,12 +8,13 @@ The code can be directly used:
 """
 
 import os, time
-import re
 # import fnmatch
 
 import py4vasp, plotly
 from selenium import webdriver, common
 import plotly.express as px
+
+from projection import normalize_selection
 # import numpy as np
 # from multiprocessing import Event, Process, Pool
 
@@ -540,7 +541,7 @@ DoS:
     """
 
     if selection:
-      selection = re.sub('^ +|  +| +$', '', str(selection))
+      selection = normalize_selection(str(selection))
     else:
       selection = 'up, down'
     self.selection = selection
@@ -0,0 +1,160 @@
+"""Broadening, resampling and integration of spectra such as the DoS
+
+All curves on one energy grid are processed together: the broadening is a
+single FFT convolution of the (curve x energy) array with the analytic
+transform of the kernel, the resampling a single linear interpolation.
+`IntegratedDos` integrates the curves once and counts electrons by lookup.
+
+Example
+-------
+>>> energies, values = process_spectrum(
+...   energies, np.array([dos_up, dos_down]), width=0.1, step=0.01
+... )
+"""
+
+import numpy as np
+
+
+KERNELS = ('gaussian', 'lorentzian')
+
+
+def uniform_grid(energies: np.ndarray, step: float = None) -> np.ndarray:
+  """Equidistant grid over `energies`, by default with their mean step"""
+  energies = np.asarray(energies, dtype=float)
+  if step is None:
+    step = (energies[-1] - energies[0]) / (len(energies) - 1)
+  number_points = int(round((energies[-1] - energies[0]) / step)) + 1
+  return energies[0] + step * np.arange(number_points)
+
+
+def resample(energies: np.ndarray, values: np.ndarray, new_energies: np.ndarray) -> np.ndarray:
+  """Linear interpolation of every curve of `values` (... x energy) at once
+
+  Points outside of `energies` are 0.
+  """
+  energies = np.asarray(energies, dtype=float)
+  values = np.asarray(values, dtype=float)
+  new_energies = np.asarray(new_energies, dtype=float)
+  right = np.clip(np.searchsorted(energies, new_energies), 1, len(energies) - 1)
+  left = right - 1
+  weight = (new_energies - energies[left]) / (energies[right] - energies[left])
+  resampled = values[..., left] * (1 - weight) + values[..., right] * weight
+  outside = (new_energies < energies[0]) | (new_energies > energies[-1])
+  resampled[..., outside] = 0
+  return resampled
+
+
+def broaden(energies: np.ndarray, values: np.ndarray, width: float, kind: str = 'gaussian') -> np.ndarray:
+  """Convolve every curve of `values` (... x energy) with a kernel via FFT
+
+  The area under every curve is kept. The curves are zero padded, so the
+  ends of the grid don't wrap around.
+
+  Parameters
+  ----------
+  energies : np.ndarray
+    an equidistant energy grid, see `uniform_grid`
+  values : np.ndarray
+    the curves (... x energy)
+  width : float
+    full width at half maximum of the kernel in eV
+  kind : str
+    'gaussian' or 'lorentzian'
+  """
+  if kind not in KERNELS:
+    raise ValueError(f"Unknown broadening {kind!r}, use one of {KERNELS}")
+  values = np.asarray(values, dtype=float)
+  step = energies[1] - energies[0]
+  size = 2 * values.shape[-1]
+  frequencies = np.fft.rfftfreq(size, d=step)
+  if kind == 'gaussian':
+    sigma = width / (2 * np.sqrt(2 * np.log(2)))
+    kernel = np.exp(-2 * (np.pi * sigma * frequencies)**2)
+  else:
+    gamma = width / 2
+    kernel = np.exp(-2 * np.pi * gamma * frequencies)
+  transformed = np.fft.rfft(values, n=size, axis=-1) * kernel
+  return np.fft.irfft(transformed, n=size, axis=-1)[..., :values.shape[-1]]
+
+
+def process_spectrum(
+  energies: np.ndarray, values: np.ndarray,
+  width: float = None, kind: str = 'gaussian', step: float = None
+) -> tuple:
+  """Broaden the curves by `width` then resample them with `step`
+
+  A grid that isn't equidistant is resampled on one before broadening.
+
+  Returns
+  -------
+  tuple
+    (energies, values) on the new grid
+  """
+  energies = np.asarray(energies, dtype=float)
+  values = np.asarray(values, dtype=float)
+  if width:
+    grid = uniform_grid(energies)
+    if not np.allclose(grid, energies):
+      values, energies = resample(energies, values, grid), grid
+    values = broaden(energies, values, width, kind)
+  if step:
+    grid = uniform_grid(energies, step)
+    values, energies = resample(energies, values, grid), grid
+  return energies, values
+
+
+def cumulative(energies: np.ndarray, values: np.ndarray) -> np.ndarray:
+  """Trapezoidal integral of every curve (... x energy) from the first energy"""
+  energies = np.asarray(energies, dtype=float)
+  values = np.asarray(values, dtype=float)
+  steps = 0.5 * (values[..., 1:] + values[..., :-1]) * np.diff(energies)
+  return np.concatenate(
+    (np.zeros(values.shape[:-1] + (1,)), np.cumsum(steps, axis=-1)), axis=-1
+  )
+
+
+class IntegratedDos:
+  """Cumulative DoS of several curves, integrated once
+
+  Counting the electrons up to any energy is a binary search plus a linear
+  interpolation between two grid points, nothing is integrated again.
+
+  Parameters
+  ----------
+  energies : np.ndarray
+    the energy grid, relative to the Fermi energy
+  curves : dict
+    {name: DoS}, e.g. `ProjectedDos.read(selection)` without 'energies'
+
+  Example
+  -------
+  >>> integrated = IntegratedDos(energies, {'V_d': dos})
+  >>> integrated.count()           # electrons up to the Fermi energy
+  >>> integrated.count([-1, 0, 1]) # at several energies at once
+  """
+  def __init__(self, energies: np.ndarray, curves: dict) -> None:
+    self.energies = np.asarray(energies, dtype=float)
+    self.names = list(curves)
+    self.values = cumulative(self.energies, [curves[name] for name in self.names])
+
+  def __repr__(self) -> str:
+    return f"{self.__class__.__name__}({self.names})"
+
+  def __getitem__(self, name: str) -> np.ndarray:
+    """The cumulative DoS of `name` on the energy grid"""
+    return self.values[self.names.index(name)]
+
+  def count(self, energy=0.0) -> dict:
+    """Electrons per curve up to `energy` (a number or an array)
+
+    Returns
+    -------
+    dict
+      {name: count}, a number or an array like `energy`
+    """
+    energy = np.clip(np.asarray(energy, dtype=float), self.energies[0], self.energies[-1])
+    right = np.clip(np.searchsorted(self.energies, energy), 1, len(self.energies) - 1)
+    left = right - 1
+    weight = (energy - self.energies[left]) / (self.energies[right] - self.energies[left])
+    counts = self.values[:, left] * (1 - weight) + self.values[:, right] * weight
+    return dict(zip(self.names, counts))
@@ -0,0 +1,324 @@
+"""Structure rendering for large cells with a periodic cell-list bond search
+
+The bonds are found by binning the atoms and their periodic images into
+cubes of the largest bond length, so only neighbouring cubes are
+compared and the search scales linearly with the number of atoms. The
+atoms are drawn as one marker trace per element, all bonds and the cell
+as single line traces with NaN separators. `ArrowFigure` adds forces or
+magnetic moments as one line and one cone trace.
+
+Example
+-------
+>>> from vasp_h5 import Result
+>>> r = Result("/path/to/supercell")
+>>> r.structure_figure().plot()
+>>> r.force_figure(threshold=0.05).plot()
+"""
+
+from itertools import product
+
+import numpy as np
+import plotly
+
+from plotly_object import PlotlyFigure
+
+
+# covalent radii in Å, Cordero et al., Dalton Trans. 2832 (2008)
+COVALENT_RADII = {
+  'H': 0.31, 'He': 0.28, 'Li': 1.28, 'Be': 0.96, 'B': 0.84, 'C': 0.76,
+  'N': 0.71, 'O': 0.66, 'F': 0.57, 'Ne': 0.58, 'Na': 1.66, 'Mg': 1.41,
+  'Al': 1.21, 'Si': 1.11, 'P': 1.07, 'S': 1.05, 'Cl': 1.02, 'Ar': 1.06,
+  'K': 2.03, 'Ca': 1.76, 'Sc': 1.70, 'Ti': 1.60, 'V': 1.53, 'Cr': 1.39,
+  'Mn': 1.39, 'Fe': 1.32, 'Co': 1.26, 'Ni': 1.24, 'Cu': 1.32, 'Zn': 1.22,
+  'Ga': 1.22, 'Ge': 1.20, 'As': 1.19, 'Se': 1.20, 'Br': 1.20, 'Kr': 1.16,
+  'Rb': 2.20, 'Sr': 1.95, 'Y': 1.90, 'Zr': 1.75, 'Nb': 1.64, 'Mo': 1.54,
+  'Tc': 1.47, 'Ru': 1.46, 'Rh': 1.42, 'Pd': 1.39, 'Ag': 1.45, 'Cd': 1.44,
+  'In': 1.42, 'Sn': 1.39, 'Sb': 1.39, 'Te': 1.38, 'I': 1.39, 'Xe': 1.40,
+  'Cs': 2.44, 'Ba': 2.15, 'La': 2.07, 'Hf': 1.75, 'Ta': 1.70, 'W': 1.62,
+  'Re': 1.51, 'Os': 1.44, 'Ir': 1.41, 'Pt': 1.36, 'Au': 1.36, 'Hg': 1.32,
+  'Pb': 1.46, 'Bi': 1.48,
+}
+DEFAULT_RADIUS = 1.5
+
+
+def periodic_images(fractional: np.ndarray, lattice_vectors: np.ndarray, cutoff: float) -> tuple:
+  """The atoms, wrapped into the cell, and their images within `cutoff` of it
+
+  Returns
+  -------
+  tuple
+    (cartesian positions (point x 3), atom index of every point), the
+    first points are the atoms themselves
+  """
+  fractional = np.mod(fractional, 1)
+  # distance between opposite faces of the cell in fractional units
+  margin = cutoff * np.linalg.norm(np.linalg.inv(lattice_vectors).T, axis=1)
+  shifts = np.array([
+    shift for shift in product((0, -1, 1), repeat=3)
+  ])
+  images = fractional[None, :, :] + shifts[:, None, :]
+  inside = np.all((images >= -margin) & (images <= 1 + margin), axis=-1)
+  inside[0] = True
+  points = images[inside] @ lattice_vectors
+  atoms = np.broadcast_to(np.arange(len(fractional)), inside.shape)[inside]
+  return points, atoms
+
+
+def cell_list_pairs(points: np.ndarray, number_centers: int, cutoff: float) -> tuple:
+  """All pairs closer than `cutoff` with a first point among the centers
+
+  The points are binned into cubes of edge `cutoff`, a center is compared
+  with the points of the 27 cubes around it only.
+
+  Parameters
+  ----------
+  points : np.ndarray
+    cartesian positions (point x 3), the first `number_centers` are the
+    centers
+  number_centers : int
+    the number of centers
+  cutoff : float
+    the largest distance
+
+  Returns
+  -------
+  tuple
+    (center indices, point indices, distances), a pair of two centers
+    appears once
+  """
+  bins = np.floor((points - points.min(axis=0)) / cutoff).astype(int)
+  shape = bins.max(axis=0) + 1
+  keys = np.ravel_multi_index(bins.T, shape)
+  order = np.argsort(keys, kind='stable')
+  sorted_keys = keys[order]
+
+  centers, others = [], []
+  for offset in product((-1, 0, 1), repeat=3):
+    neighbours = bins[:number_centers] + offset
+    valid = np.all((neighbours >= 0) & (neighbours < shape), axis=1)
+    neighbour_keys = np.ravel_multi_index(neighbours[valid].T, shape)
+    start = np.searchsorted(sorted_keys, neighbour_keys, 'left')
+    counts = np.searchsorted(sorted_keys, neighbour_keys, 'right') - start
+    # the concatenated ranges start[k]:start[k] + counts[k]
+    first = np.repeat(start - np.cumsum(counts) + counts, counts)
+    centers.append(np.repeat(np.flatnonzero(valid), counts))
+    others.append(order[first + np.arange(counts.sum())])
+  centers, others = np.concatenate(centers), np.concatenate(others)
+
+  # a pair of two centers once, no self pairs
+  keep = (others >= number_centers) | (others > centers)
+  centers, others = centers[keep], others[keep]
+  distances = np.linalg.norm(points[others] - points[centers], axis=1)
+  close = distances <= cutoff
+  return centers[close], others[close], distances[close]
+
+
+def find_bonds(
+  fractional: np.ndarray, lattice_vectors: np.ndarray, elements: list,
+  bond_factor: float = 1.15
+) -> tuple:
+  """Bonds of a periodic structure, shorter than `bond_factor` times the sum
+  of the covalent radii of both atoms
+
+  Returns
+  -------
+  tuple
+    (cartesian positions of the points, atom indices, point indices), a
+    bond goes from an atom to a point, which is an atom or a periodic image
+  """
+  radii = np.array([COVALENT_RADII.get(element, DEFAULT_RADIUS) for element in elements])
+  cutoff = 2 * bond_factor * radii.max()
+  points, atoms = periodic_images(fractional, lattice_vectors, cutoff)
+  first, second, distances = cell_list_pairs(points, len(elements), cutoff)
+  bonded = distances <= bond_factor * (radii[first] + radii[atoms[second]])
+  return points, first[bonded], second[bonded]
+
+
+def _segments(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+  """Line segments (segment x 3) joined with NaN, (3 x point) for a trace"""
+  separator = np.full_like(starts, np.nan)
+  return np.stack((starts, ends, separator), axis=1).reshape(-1, 3).T
+
+
+# the 12 edges of the unit cube as pairs of corners
+_CELL_EDGES = [
+  (corner, corner + step)
+  for corner in map(np.array, product((0, 1), repeat=3))
+  for step in np.eye(3, dtype=int)
+  if (corner + step).max() <= 1
+]
+
+
+class StructureFigure(PlotlyFigure):
+  """Atoms, bonds and cell of one structure in a few traces
+
+  Parameters
+  ----------
+  data : dict
+    {'positions': fractional (atom x 3), 'lattice_vectors': (3 x 3),
+    'elements': [str]}
+
+  Attributes
+  ----------
+  is_bonded : bool
+    draw the bonds
+  bond_factor : float
+    bonds are shorter than this times the sum of the covalent radii
+  atom_scale : float
+    marker size per Å of covalent radius
+  """
+  def __init__(
+    self,
+    data: dict = None,
+    width: float = 1000, height: float = 1000,
+    use_browser: str = 'chrome', mathjax_path: str = None
+  ) -> None:
+    super().__init__(
+      data or {},
+      width, height,
+      bgcolor = 'white', title = 'Structure',
+      use_browser = use_browser, mathjax_path = mathjax_path
+    )
+    self.file.name = 'structure-plot'
+    self.file.fmt = 'png'
+    self.is_bonded = True
+    self.bond_factor = 1.15
+    self.atom_scale = 12
+    self.line.width = 3
+    self.line.color = 'grey'
+
+  def create_figure(self):
+    fractional = np.asarray(self.data['positions'], dtype=float)
+    lattice_vectors = np.asarray(self.data['lattice_vectors'], dtype=float)
+    elements = list(self.data['elements'])
+    cartesian = np.mod(fractional, 1) @ lattice_vectors
+
+    traces = []
+    corners = np.array([start for start, _ in _CELL_EDGES]) @ lattice_vectors
+    ends = np.array([end for _, end in _CELL_EDGES]) @ lattice_vectors
+    x, y, z = _segments(corners, ends)
+    traces.append(plotly.graph_objs.Scatter3d(
+      x = x, y = y, z = z, mode = 'lines', name = 'cell',
+      line = {'color': 'black', 'width': 2}, hoverinfo = 'skip',
+    ))
+
+    if self.is_bonded and len(elements) > 1:
+      points, first, second = find_bonds(
+        fractional, lattice_vectors, elements, self.bond_factor
+      )
+      # a bond to an image ends at the midpoint, near the cell boundary, the
+      # image's partner inside the cell draws the other half
+      ends = np.where(
+        (second < len(elements))[:, None], points[second], 0.5 * (points[first] + points[second])
+      )
+      x, y, z = _segments(points[first], ends)
+      traces.append(plotly.graph_objs.Scatter3d(
+        x = x, y = y, z = z, mode = 'lines', name = 'bonds',
+        line = {'color': self.line.color, 'width': self.line.width},
+        hoverinfo = 'skip',
+      ))
+
+    self.colorscale.init()
+    names = np.array(elements)
+    for element in dict.fromkeys(elements):
+      atoms = np.flatnonzero(names == element)
+      traces.append(plotly.graph_objs.Scatter3d(
+        x = cartesian[atoms, 0], y = cartesian[atoms, 1], z = cartesian[atoms, 2],
+        mode = 'markers', name = element, text = [f"{element}{atom + 1}" for atom in atoms],
+        marker = {
+          'size': self.atom_scale * COVALENT_RADII.get(element, DEFAULT_RADIUS),
+          'color': self.colorscale.next, 'line': {'width': 0},
+        },
+      ))
+
+    self.figure = plotly.graph_objs.Figure(data = traces)
+    self.figure.layout.title.text = self.title
+    self.figure.layout.paper_bgcolor = self.bgcolor
+    self.figure.layout.scene = {
+      'aspectmode': 'data',
+      'xaxis': {'visible': False}, 'yaxis': {'visible': False}, 'zaxis': {'visible': False},
+    }
+
+
+def moment_vectors(spin_moments: np.ndarray) -> np.ndarray:
+  """Moment per atom as a vector, (component x atom x orbital) -> (atom x 3)
+
+  Collinear moments point along z.
+  """
+  moments = np.asarray(spin_moments)[1:].sum(axis=-1)
+  if len(moments) == 1:
+    return np.stack((np.zeros_like(moments[0]), np.zeros_like(moments[0]), moments[0]), axis=-1)
+  return moments.T
+
+
+class ArrowFigure(StructureFigure):
+  """A structure with one arrow per atom, e.g. forces or magnetic moments
+
+  All arrows are one line trace for the shafts and one cone trace for the
+  heads, however many atoms there are.
+
+  Parameters
+  ----------
+  data : dict
+    like `StructureFigure` and 'vectors' (atom x 3)
+
+  Attributes
+  ----------
+  scale : float
+    arrow length in Å per unit of the vectors
+  threshold : float
+    arrows shorter than this (in units of the vectors) are left out
+  head_size : float
+    length of the arrow heads in Å, by default a tenth of the shortest 
+    lattice vector, the same for every arrow
+  arrow_color : str
+  """
+  def __init__(
+    self,
+    data: dict = None,
+    width: float = 1000, height: float = 1000,
+    use_browser: str = 'chrome', mathjax_path: str = None
+  ) -> None:
+    super().__init__(data, width, height, use_browser, mathjax_path)
+    self.title = 'Arrows'
+    self.file.name = 'arrow-plot'
+    self.is_bonded = False
+    self.scale = 1.0
+    self.threshold = 0.0
+    self.head_size = None
+    self.arrow_color = 'black'
+
+  def create_figure(self):
+    super().create_figure()
+    cartesian = np.mod(np.asarray(self.data['positions'], dtype=float), 1) @ np.asarray(
+      self.data['lattice_vectors'], dtype=float
+    )
+    vectors = np.asarray(self.data['vectors'], dtype=float)
+    lengths = np.linalg.norm(vectors, axis=-1)
+    shown = lengths > self.threshold
+    if not shown.any():
+      return
+    tails = cartesian[shown]
+    arrows = self.scale * vectors[shown]
+    tips = tails + arrows
+
+    x, y, z = _segments(tails, tips)
+    self.figure.add_trace(plotly.graph_objs.Scatter3d(
+      x = x, y = y, z = z, mode = 'lines', name = 'arrows', legendgroup = 'arrows',
+      line = {'color': self.arrow_color, 'width': self.line.width},
+      hoverinfo = 'skip',
+    ))
+    # the cone size is sizeref times the norm of (u, v, w), unit vectors 
+    # give every head the same size, independent of the magnitudes
+    head_size = self.head_size or 0.1 * np.linalg.norm(
+      np.asarray(self.data['lattice_vectors'], dtype=float), axis=-1
+    ).min()
+    directions = arrows / np.linalg.norm(arrows, axis=-1, keepdims=True)
+    self.figure.add_trace(plotly.graph_objs.Cone(
+      x = tips[:, 0], y = tips[:, 1], z = tips[:, 2],
+      u = directions[:, 0], v = directions[:, 1], w = directions[:, 2],
+      anchor = 'tip', sizemode = 'absolute', sizeref = head_size,
+      colorscale = [[0, self.arrow_color], [1, self.arrow_color]],
+      showscale = False, name = 'arrows', legendgroup = 'arrows',
+      text = [f"{length:.3f}" for length in lengths[shown]], hoverinfo = 'text',
+    ))
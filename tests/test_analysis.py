@@ -0,0 +1,53 @@
+import numpy as np
+
+from analysis import band_edges, occupied_states, spin_band_edges
+
+
+def insulator(fermi_offset: float = 0.0):
+  """Two valence and one conduction band on 11 k-points, VBM at k = 5"""
+  k = np.linspace(-1, 1, 11)
+  energies = np.stack([-3 - k**2, -0.5 * k**2, 1.0 + k**2], axis=1)
+  return energies - fermi_offset
+
+
+def test_band_gap_from_the_sign_of_the_energies():
+  edges = band_edges(insulator(0.1))
+  assert not edges.is_metal
+  assert np.isclose(edges.gap, 1.0)
+  assert edges.vbm_kpoint == edges.cbm_kpoint == 5 and edges.is_direct
+
+
+def test_fermi_energy_slightly_below_the_vbm():
+  # E_F 5 meV below the VBM, Gaussian smearing leaves the VBM half empty
+  energies = insulator(-0.005)
+  occupations = np.ones_like(energies)
+  occupations[:, 2] = 0
+  occupations[5, 1] = 0.45
+  assert band_edges(energies).is_metal
+  edges = band_edges(energies, occupations = occupations)
+  assert not edges.is_metal
+  assert np.isclose(edges.gap, 1.0)
+  assert edges.vbm_kpoint == 5
+
+
+def test_partially_filled_band_is_a_metal():
+  energies = insulator()
+  occupations = np.ones_like(energies)
+  occupations[:, 2] = 0
+  occupations[:6, 1] = 0
+  occupied, is_partial = occupied_states(occupations)
+  assert is_partial
+  assert band_edges(energies, occupations = occupations).is_metal
+
+
+def test_spin_total_uses_the_occupations_of_each_spin():
+  up, down = insulator(-0.005), insulator(-0.005) + 0.2
+  occupations = np.ones_like(up)
+  occupations[:, 2] = 0
+  occupations[5, 1] = 0.3
+  edges = spin_band_edges(
+    {'up': up, 'down': down}, occupations = {'up': occupations, 'down': occupations}
+  )
+  assert not edges['total'].is_metal
+  assert np.isclose(edges['total'].vbm, up[5, 1] + 0.2)
+  assert np.isclose(edges['total'].cbm, up[5, 2])
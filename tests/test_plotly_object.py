@@ -0,0 +1,48 @@
+import json, re
+
+import numpy as np
+import plotly
+
+from plotly_object import (
+  PlotlyFigure, TYPED_ARRAY_DTYPES, _TYPED_ARRAY_DECODER, _decode_array, 
+)
+
+
+class ScatterFigure(PlotlyFigure):
+  def __init__(self, data: dict) -> None:
+    super().__init__(data)
+    self.file.fmt = None
+
+  def create_figure(self):
+    self.figure = plotly.graph_objs.Figure(data=[
+      plotly.graph_objs.Scatter(x = x, y = y) for x, y in self.data
+    ])
+
+
+def plotted_data(path) -> list:
+  """The data passed to Plotly.newPlot by the html file"""
+  with open(path, encoding='utf-8') as file:
+    html = file.read()
+  call = re.search(r'Plotly\.newPlot\(\s*"[^"]*",\s*', html)
+  data, _ = json.JSONDecoder().raw_decode(html, call.end())
+  return data
+
+
+def test_base64_html_round_trip(tmp_path):
+  traces = [
+    (np.arange(5), np.linspace(-1, 1, 5)),                  # i1, f8
+    (np.arange(1000), np.sin(np.arange(1000)) * 1e3),       # i2, f8
+    ([0.5, 1.5, 2.5], [1, 2, 3]),                           # plain lists
+  ]
+  figure = ScatterFigure(traces)
+  figure.create_figure()
+  path = tmp_path / 'plot.html'
+  figure.write_base64_html(str(path))
+
+  data = plotted_data(path)
+  assert len(data) == len(traces)
+  for trace, (x, y) in zip(data, traces):
+    for key, expected in (('x', x), ('y', y)):
+      assert trace[key]['dtype'] in TYPED_ARRAY_DTYPES
+      assert f"{trace[key]['dtype']}:" in _TYPED_ARRAY_DECODER
+      np.testing.assert_allclose(_decode_array(trace[key]), expected, rtol=1e-6)
@@ -0,0 +1,16 @@
+import pytest
+
+from projection import SelectionError, normalize_selection, parse_selection
+
+
+def test_normalize_selection():
+  assert normalize_selection(' up( V (dxy,dyz))  S') == 'up(V(dxy, dyz)), S'
+  assert normalize_selection('V(d), O') == 'V(d), O'
+
+
+@pytest.mark.parametrize('selection', ['V, (d)', '(d)', 'up((d))'])
+def test_group_without_name_is_rejected(selection):
+  with pytest.raises(SelectionError):
+    normalize_selection(selection)
+  with pytest.raises(SelectionError):
+    parse_selection(selection)
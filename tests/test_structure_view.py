@@ -0,0 +1,52 @@
+from itertools import product
+
+import numpy as np
+
+from structure_view import COVALENT_RADII, StructureFigure, find_bonds
+
+
+def test_bond_inside_the_cell_reaches_both_atoms():
+  figure = StructureFigure({
+    'positions': [[0.5, 0.5, 0.5], [0.5, 0.5, 0.6]],
+    'lattice_vectors': 10 * np.eye(3), 'elements': ['C', 'C'],
+  })
+  figure.create_figure()
+  bonds = next(trace for trace in figure.figure.data if trace.name == 'bonds')
+  assert np.allclose(np.array(bonds.z, dtype=float)[:2], [5, 6])
+
+
+def brute_force_bonds(fractional, lattice_vectors, elements, bond_factor=1.15) -> set:
+  """(atom, atom, rounded bond vector) of all atoms and their images"""
+  radii = [COVALENT_RADII[element] for element in elements]
+  cartesian = np.mod(fractional, 1) @ lattice_vectors
+  bonds = set()
+  for i, j in product(range(len(elements)), repeat=2):
+    for shift in product((-1, 0, 1), repeat=3):
+      vector = cartesian[j] + np.array(shift) @ lattice_vectors - cartesian[i]
+      distance = np.linalg.norm(vector)
+      if 0 < distance <= bond_factor * (radii[i] + radii[j]):
+        bonds.add((i, j, *np.round(vector, 6)))
+  return bonds
+
+
+def test_find_bonds_matches_brute_force():
+  rng = np.random.default_rng(1)
+  fractional = rng.uniform(-0.2, 1.2, (60, 3))
+  lattice_vectors = np.array([[9.0, 0, 0], [2.0, 8.5, 0], [0.5, 1.0, 9.5]])
+  elements = list(rng.choice(['C', 'O', 'Si'], 60))
+  points, first, second = find_bonds(fractional, lattice_vectors, elements)
+
+  # the atom of every point, its image in the cell is the atom
+  image = np.mod(np.linalg.solve(lattice_vectors.T, points.T).T.round(9), 1)
+  atoms = np.argmin(np.linalg.norm(
+    image[:, None, :] - np.mod(fractional, 1)[None, :, :], axis=-1
+  ), axis=1)
+  found = set()
+  for a, p in zip(first, second):
+    vector = points[p] - points[a]
+    found.add((a, atoms[p], *np.round(vector, 6)))
+    if p < len(elements):
+      # a pair of two atoms in the cell is returned once
+      found.add((atoms[p], a, *np.round(-vector, 6)))
+  assert len(found) > 0
+  assert found == brute_force_bonds(fractional, lattice_vectors, elements)
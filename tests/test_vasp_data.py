@@ -0,0 +1,55 @@
+import numpy as np
+
+from vasp_data import ProjectedBand
+
+
+class FakeBand(ProjectedBand):
+  """Four bands on 5 k-points with fixed projections, no file"""
+  def __init__(self) -> None:
+    super().__init__(None, None)
+    rng = np.random.default_rng(0)
+    self.energies = np.linspace(-2, 1, 5)[:, None] + np.array([-10.0, -1.0, 1.0, 10.0])
+    self.weights = rng.uniform(0, 1, self.energies.shape)
+    self.projected = []
+
+  @property
+  def base(self) -> dict:
+    return {
+      'kpoint_distances': np.linspace(0, 1, 5), 'kpoint_labels': None,
+      'bands': self.energies,
+    }
+
+  def project(self, selection: str = None, trailing: tuple = ()) -> dict:
+    weights = self.weights[tuple(trailing)]
+    self.projected.append(weights.shape[1])
+    return {'V(d)': weights}
+
+
+def test_fat_bands_have_the_width_of_py4vasp():
+  band = FakeBand()
+  figure = band.to_plotly('V(d)', width=0.4)
+  assert len(figure.data) == 4
+  for index, trace in enumerate(figure.data):
+    y = np.asarray(trace.y)
+    lower, upper = y[:5], y[5:][::-1]
+    assert np.allclose(0.5 * (upper - lower), 0.4 * band.weights[:, index])
+    assert np.allclose(0.5 * (upper + lower), band.energies[:, index])
+
+
+def test_bands_outside_the_window_are_not_projected():
+  band = FakeBand()
+  figure = band.to_plotly('V(d)', window=(-4, 0))
+  # band 1 spans -3 ... 0, band 2 -1 ... 2
+  assert band.projected == [2]
+  assert len(figure.data) == 2
+  y = np.asarray(figure.data[0].y)
+  assert np.allclose(0.5 * (y[:5] + y[5:][::-1]), band.energies[:, 1])
+
+
+def test_band_range_of_both_spins():
+  up = np.array([[-5.0, -1.0, 3.0], [-4.0, 0.0, 4.0]])
+  bands = {'up': up, 'down': up + 2.5}
+  assert ProjectedBand.band_range(bands, (1, 2)) == slice(1, 2)
+  assert ProjectedBand.band_range(bands, (-1.5, -1)) == slice(0, 2)
+  assert ProjectedBand.band_range(bands, (None, -6)) == slice(0, 0)
+  assert ProjectedBand.band_range(bands) == slice(0, 3)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from volumetric import Density, plane_slice
+
+
+def sphere(size: int = 30, length: float = 10.0) -> Density:
+  """A Gaussian at the centre of a cubic cell, isovalue 0.5 at r = 2 Å"""
+  x = np.arange(size) / size * length - length / 2
+  r2 = x[:, None, None]**2 + x[None, :, None]**2 + x[None, None, :]**2
+  return Density(np.exp(-np.log(2) * r2 / 4), length * np.eye(3))
+
+
+def centroid(vertices: np.ndarray, faces: np.ndarray) -> np.ndarray:
+  triangles = vertices[faces]
+  areas = np.linalg.norm(np.cross(
+    triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0]
+  ), axis=-1)
+  return (areas[:, None] * triangles.mean(axis=1)).sum(axis=0) / areas.sum()
+
+
+@pytest.mark.parametrize('resolution', [None, 1.0, 4 / 3])
+def test_downsampling_keeps_the_centroid(resolution):
+  # 1 Å: blocks of 3 points, 4/3 Å: blocks of 4 points, the last one padded
+  density = sphere()
+  vertices, faces = density.isosurface(0.5, resolution)
+  assert np.allclose(centroid(vertices, faces), 5.0, atol=0.05)
+  radius = np.linalg.norm(vertices - 5.0, axis=-1)
+  assert np.allclose(radius, 2.0, atol=0.3)
+
+
+def test_slice_of_a_hexagonal_cell_keeps_its_shape():
+  # a peak at the Cartesian point (2, 3) Å of the basal plane
+  a = 6.0
+  lattice_vectors = np.array([[a, 0, 0], [-a / 2, a * np.sqrt(3) / 2, 0], [0, 0, 4.0]])
+  fractional = np.stack(
+    np.meshgrid(*(np.arange(n) / n for n in (48, 48, 8)), indexing='ij'), axis=-1
+  )
+  offset = fractional[..., :2] - np.linalg.solve(lattice_vectors[:2, :2].T, [2.0, 3.0])
+  offset -= np.round(offset)
+  cartesian = offset @ lattice_vectors[:2, :2]
+  grid = np.exp(-(cartesian**2).sum(axis=-1))
+  result = plane_slice(grid, lattice_vectors, shape=(181, 157))
+  values = result['values']
+  # the parallelogram spans x from -a/2 to a, the corners outside are blank
+  assert np.isclose(result['x'][0], -a / 2) and np.isclose(result['x'][-1], a)
+  assert np.isclose(result['y'][-1], a * np.sqrt(3) / 2)
+  assert np.isnan(values[0, 0]) and np.isnan(values[-1, -1])
+  i, j = np.unravel_index(np.nanargmax(values), values.shape)
+  assert np.isclose(result['x'][i], 2.0, atol=0.1) and np.isclose(result['y'][j], 3.0, atol=0.1)
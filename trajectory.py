@@ -0,0 +1,210 @@
+"""Lazy, step-sliceable access to the ionic steps of vaspout.h5
+
+Slicing only narrows the steps, nothing is read until `read()` or
+iteration, and then only the selected steps (a strided hyperslab).
+
+Example
+-------
+>>> from vasp_h5 import Result
+>>> r = Result("/path/to/md")
+>>> len(r.trajectory)                        # from the dataset shapes
+>>> part = r.trajectory[1000:2000:10]        # lazy, 100 steps
+>>> part.read(['positions', 'forces'])       # {name: (step x ...)}
+>>> for frame in part.frames(chunk_size=20): # at most 20 steps in memory
+...   frame['step'], frame['positions']
+>>> part.derived()['max_force']              # per step, batched
+"""
+
+import numpy as np
+
+from live import energy_column, max_forces, total_moments
+from reader import H5Reader
+
+
+def volumes(lattice_vectors: np.ndarray) -> np.ndarray:
+  """Cell volume per step, (step x 3 x 3) -> (step)"""
+  return np.abs(np.linalg.det(lattice_vectors))
+
+
+def lattice_parameters(lattice_vectors: np.ndarray) -> np.ndarray:
+  """a, b, c (Å) and α, β, γ (°) per step, (step x 3 x 3) -> (step x 6)"""
+  lengths = np.linalg.norm(lattice_vectors, axis=-1)
+  angles = [
+    np.degrees(np.arccos(np.clip(
+      np.einsum('...i,...i', lattice_vectors[..., j, :], lattice_vectors[..., k, :])
+      / (lengths[..., j] * lengths[..., k]), -1, 1
+    )))
+    for j, k in ((1, 2), (0, 2), (0, 1))
+  ]
+  return np.concatenate((lengths, np.stack(angles, axis=-1)), axis=-1)
+
+
+def pressures(stress: np.ndarray) -> np.ndarray:
+  """Pressure per step in kB, a third of the trace of the stress (step x 3 x 3)"""
+  return np.trace(stress, axis1=-2, axis2=-1) / 3
+
+
+def moment_lengths(spin_moments: np.ndarray) -> np.ndarray:
+  """Length of the moment of every atom per step
+
+  (step x component x atom x orbital) -> (step x atom), summed over the
+  orbitals, the component 0 is the charge.
+  """
+  return np.linalg.norm(spin_moments[:, 1:].sum(axis=-1), axis=1)
+
+
+class Trajectory:
+  """The ionic steps `steps` of a vaspout.h5, read on demand
+
+  Parameters
+  ----------
+  reader : H5Reader
+    the reader of vaspout.h5
+  steps : range, optional
+    the selected steps, by default all of them
+
+  Note
+  ----
+  `lattice_vectors` are multiplied by the scale, `positions` are in
+  fractional coordinates as written by VASP.
+  """
+  QUANTITIES = (
+    'positions', 'lattice_vectors', 'forces', 'stress', 'energies', 'spin_moments',
+  )
+
+  # quantities of `derived` and the datasets they need
+  DERIVED = {
+    'energy': 'energies',
+    'volume': 'lattice_vectors',
+    'lattice_parameters': 'lattice_vectors',
+    'max_force': 'forces',
+    'pressure': 'stress',
+    'moment_lengths': 'spin_moments',
+    'total_moment': 'spin_moments',
+  }
+
+  def __init__(self, reader: H5Reader, steps: range = None) -> None:
+    self.reader = reader
+    self.steps = range(self.number_steps(reader)) if steps is None else steps
+    self._derived = None
+
+  def __repr__(self) -> str:
+    return f"{self.__class__.__name__}({self.reader!r}, {self.steps})"
+
+  @classmethod
+  def number_steps(cls, reader: H5Reader) -> int:
+    """Steps written completely, from the dataset shapes only"""
+    with reader.open() as file:
+      lengths = [
+        len(file[key]) for key in (
+          reader.key(file, name) for name in ('positions', 'forces', 'energies')
+        )
+        if key is not None
+      ]
+    return min(lengths, default=0)
+
+  def __len__(self) -> int:
+    return len(self.steps)
+
+  def __getitem__(self, index):
+    """A narrower Trajectory for a slice, one frame for an int"""
+    if isinstance(index, slice):
+      return self.__class__(self.reader, self.steps[index])
+    return self.__class__(self.reader, self.steps[index:index + 1 or None]).frame(0)
+
+  def __iter__(self):
+    return self.frames()
+
+  def available(self) -> list:
+    """The `QUANTITIES` present in the file"""
+    with self.reader.open() as file:
+      return [name for name in self.QUANTITIES if self.reader.key(file, name)]
+
+  def read(self, quantities: list = None) -> dict:
+    """Read the selected steps of `quantities` (all available by default)
+
+    Returns
+    -------
+    dict
+      {'step': (step), name: (step x ...)}, missing quantities are left out
+    """
+    return self._read(self.steps, quantities)
+
+  def frame(self, index: int) -> dict:
+    """One step as {'step': int, name: array}"""
+    data = self._read(self.steps[index:index + 1 or None])
+    return {name: value[0] for name, value in data.items()}
+
+  def frames(self, quantities: list = None, chunk_size: int = 256):
+    """Yield the steps one by one, reading `chunk_size` steps at a time"""
+    for start in range(0, len(self.steps), chunk_size):
+      data = self._read(self.steps[start:start + chunk_size], quantities)
+      for offset in range(len(data['step'])):
+        yield {name: value[offset] for name, value in data.items()}
+
+  def derived(self, chunk_size: int = 1024) -> dict:
+    """Energy, volume, lattice parameters, max force, pressure and moments 
+    per step, computed once per Trajectory
+
+    Every chunk of steps is read once and reduced with batched array 
+    operations, the positions aren't read.
+
+    Returns
+    -------
+    dict
+      {'step': (step), name: (step) or (step x ...)}, see `DERIVED`, 
+      missing datasets are left out
+    """
+    if self._derived is not None:
+      return self._derived
+    quantities = sorted(set(self.DERIVED.values()))
+    with self.reader.open() as file:
+      key = self.reader.key(file, 'energy_tags')
+      tags = [
+        tag.decode() if isinstance(tag, bytes) else str(tag) 
+        for tag in (file[key][()] if key else [])
+      ]
+    functions = {
+      'energy': lambda energies: energies[:, energy_column(tags)],
+      'volume': volumes,
+      'lattice_parameters': lattice_parameters,
+      'max_force': max_forces,
+      'pressure': pressures,
+      'moment_lengths': moment_lengths,
+      'total_moment': total_moments,
+    }
+    chunks = {}
+    for start in range(0, len(self.steps), chunk_size):
+      data = self._read(self.steps[start:start + chunk_size], quantities)
+      chunks.setdefault('step', []).append(data['step'])
+      for name, dataset in self.DERIVED.items():
+        if dataset in data:
+          chunks.setdefault(name, []).append(functions[name](data[dataset]))
+    self._derived = {name: np.concatenate(parts) for name, parts in chunks.items()}
+    return self._derived
+
+  def _read(self, steps: range, quantities: list = None) -> dict:
+    """Read `steps` with one strided hyperslab per quantity"""
+    quantities = self.QUANTITIES if quantities is None else quantities
+    data = {'step': np.asarray(steps)}
+    if not len(steps):
+      return data
+    first, last = min(steps), max(steps)
+    stride = abs(steps.step)
+    with self.reader.open() as file:
+      for name in quantities:
+        key = self.reader.key(file, name)
+        if key is None:
+          continue
+        values = file[key][first:last + 1:stride]
+        self.reader.bytes_read += values.nbytes
+        data[name] = values if steps.step > 0 else values[::-1]
+      scale = self.reader.key(file, 'scale')
+      if 'lattice_vectors' in data and scale is not None:
+        scale = np.asarray(file[scale][()])
+        if scale.ndim:
+          # one scale per step, selected like the lattice vectors
+          scale = scale[first:last + 1:stride]
+          scale = (scale if steps.step > 0 else scale[::-1])[:, None, None]
+        data['lattice_vectors'] = data['lattice_vectors'] * scale
+    return data
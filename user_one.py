@@ -8,6 +8,9 @@ if __name__ == '__main__':
   # path = r"D:\Ubuntu\Shared\VS2\01-2H\01-PBE\01-plusU\100_U_1.00\51-band"
 
   r = Result(path)
+  # r.band_data.memory_budget = 2**30
+  # print(r.band_edges)
+  # r.convergence_figure().plot()
  
   r.bandfig.font.size = 1
   r.bandfig.font.size_str = 'tiny'
@@ -20,11 +23,14 @@ if __name__ == '__main__':
   r.bandfig.size = (1600, 1200)
   r.bandfig.bgcolor = 'rgba(0,0,0,0)'
   r.bandfig.file.name = 'band_plot_test'
+  # r.bandfig.file.encoding = 'base64'
   r.bandfig.xrange = (None, None)
   r.bandfig.k_file = 'default'
+  r.bandfig.is_merged = True
   # r.bandfig.show()
   # r.bandfig.plot()
   # r.bandfig.ishow()
+  # r.bandfig.export('band_plot_test.npz')
 
   r.thin_bandfig.yrange = -2, 2
   # r.thin_band.figure.add_hline(
@@ -42,11 +48,18 @@ if __name__ == '__main__':
   r.dosfig.line.width = 5
   r.dosfig.colorscale.alpha = 0.1
   r.dosfig.selection = 'up(V(dxy, dyz, dxz, dz2, dx2y2))'
+  # r.dosfig.broadening = 0.1
+  # r.dosfig.energy_step = 0.01
+  # r.dosfig.is_integrated = True
+  # r.dosfig.spin_mode = 'polarization'
+  # print(r.dos_spin_polarization(r.dosfig.selection))
+  # print(r.dos_integrate(r.dosfig.selection).count())
   r.dosfig.title = r'$R_u$'
   r.dosfig.font.size = 20
   r.dosfig.font.size_str = 'Large'
   # r.dosfig.show()
   # r.dosfig.plot()
   # r.dosfig.ishow()
+  # r.dosfig.export('dos_plot_test.csv')
   r.dosfig.yrange = -4, 4
   # r.dos.plot()
\ No newline at end of file
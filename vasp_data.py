@@ -0,0 +1,314 @@
+"""Band and DoS data backed by a cached ProjectionTensor
+
+`ProjectedBand` and `ProjectedDos` offer `read(selection)` and
+`to_plotly(selection, width)` like `py4vasp.data.Band`/`Dos`, so they can
+be used as the data of `BandFigure`/`DosFigure`. The data without
+projections is read through py4vasp once, the projections are summed from
+the tensor loaded on first use, so changing the selection doesn't go back
+to the file. For large supercells set `memory_budget` to read and sum the
+projections chunk by chunk instead.
+"""
+
+import numpy as np
+import plotly
+
+from cache import cached_read
+from projection import ProjectionLayout, ProjectionTensor, normalize_selection
+from reader import H5Reader
+from spectrum import IntegratedDos
+
+
+class ProjectedData:
+  """Base class of the projected band/DoS data
+
+  Parameters
+  ----------
+  calc : py4vasp.Calculation
+    the calculation, used for the data without projections
+  reader : H5Reader
+    the reader of vaspout.h5, used for the projections
+  """
+  # attribute of `calc` and dataset of `reader`
+  QUANTITY = None
+  PROJECTIONS = None
+
+  def __init__(self, calc, reader: H5Reader) -> None:
+    self.calc = calc
+    self.reader = reader
+    # read only the hyperslab a selection needs instead of the tensor
+    self.is_partial = False
+    # bytes, if set the projections are read in k-point/energy chunks
+    self.memory_budget = None
+
+  def __repr__(self) -> str:
+    return f"{self.__class__.__name__}({self.reader!r})"
+
+  @cached_read
+  def base(self) -> dict:
+    """`read()` of py4vasp without projections, read once"""
+    data = getattr(self.calc, self.QUANTITY).read()
+    data.pop('projections', None)
+    return data
+
+  @cached_read
+  def tensor(self) -> ProjectionTensor:
+    """The projection tensor, loaded on first use"""
+    return ProjectionTensor(
+      self.reader.read(self.PROJECTIONS),
+      self.calc.topology.elements(),
+      self.reader.read_strings('orbital_types'),
+    )
+
+  @cached_read
+  def layout(self) -> ProjectionLayout:
+    """The atoms, orbitals and spins of the projections, without reading them
+    """
+    return ProjectionLayout(
+      self.calc.topology.elements(),
+      self.reader.read_strings('orbital_types'),
+      self.reader.shape(self.PROJECTIONS)[0],
+    )
+
+  def read_projections(self, selection: str, trailing: tuple = ()) -> dict:
+    """Project onto `selection` reading only the hyperslab it needs
+
+    Parameters
+    ----------
+    selection : str
+      e.g. 'V(d)'
+    trailing : tuple, optional
+      slices of the axes after the orbitals, e.g. `(slice(0, 100),)` for
+      the first 100 k-points
+    """
+    compiled = self.layout.compile(selection)
+    needed = compiled.needed()
+    block = self.reader.read_hyperslab(self.PROJECTIONS, needed, trailing)
+    return compiled.sum_block(block, needed)
+
+  def chunk_size(self, needed: tuple, memory_budget: int) -> int:
+    """Number of k-points/energies per chunk so a chunk fits the budget
+
+    Per k-point/energy, the bounding hyperslab and the copy of the `needed`
+    elements picked from it are held at once. The copy of one projection 
+    in `sum_block` is never larger than the hyperslab, which is freed by 
+    then. The projected sums are not counted.
+    """
+    shape = self.reader.shape(self.PROJECTIONS)
+    trailing = int(np.prod(shape[4:], dtype=int))
+    bounding = int(np.prod([np.ptp(index) + 1 for index in needed])) * trailing
+    picked = int(np.prod([len(index) for index in needed])) * trailing
+    bytes_per_slice = (bounding + picked) * self.reader.dtype(self.PROJECTIONS).itemsize
+    return max(1, memory_budget // bytes_per_slice)
+
+  def read_chunked(self, selection: str, memory_budget: int, trailing: tuple = ()) -> dict:
+    """Project onto `selection` one chunk of k-points/energies at a time
+
+    Every chunk is summed to the selected projections right after reading,
+    so about `memory_budget` bytes of the projections are held at once 
+    (see `chunk_size`, at least one k-point/energy is read), independent 
+    of the size of the calculation. The result is identical to the one
+    of `read_projections`, the tensor sums the same values in another order.
+
+    Parameters
+    ----------
+    selection : str
+      e.g. 'V(d)'
+    memory_budget : int
+      the bytes of one chunk of the projections
+    trailing : tuple, optional
+      slices of the axes after the orbitals, the first one is read in 
+      chunks
+    """
+    compiled = self.layout.compile(selection)
+    needed = compiled.needed()
+    first, rest = (tuple(trailing) or (slice(None),))[0], tuple(trailing)[1:]
+    begin, end, _ = first.indices(self.reader.shape(self.PROJECTIONS)[3])
+    step = self.chunk_size(needed, memory_budget)
+    chunks = {}
+    for start in range(begin, end, step):
+      block = self.reader.read_hyperslab(
+        self.PROJECTIONS, needed, (slice(start, min(start + step, end)),) + rest
+      )
+      for label, projected in compiled.sum_block(block, needed).items():
+        chunks.setdefault(label, []).append(projected)
+      del block
+    return {label: np.concatenate(parts) for label, parts in chunks.items()}
+
+  def project(self, selection: str = None, trailing: tuple = ()) -> dict:
+    """Project onto `selection`, only the `trailing` slices of the axes 
+    after the orbitals if given
+    """
+    if not selection:
+      return {}
+    if self.memory_budget:
+      return self.read_chunked(selection, self.memory_budget, trailing)
+    if self.is_partial:
+      return self.read_projections(selection, trailing)
+    return self.tensor.project(selection, trailing)
+
+  def read(self, selection: str = None, source: str = None) -> dict:
+    raise NotImplementedError
+
+  def to_plotly(self, selection: str = None, width: float = None, source: str = None):
+    raise NotImplementedError
+
+
+class ProjectedBand(ProjectedData):
+  QUANTITY = 'band'
+  PROJECTIONS = 'band_projections'
+
+  def read(self, selection: str = None, source: str = None) -> dict:
+    return {**self.base, 'projections': self.project(selection)}
+
+  @staticmethod
+  def bands(data: dict) -> dict:
+    """{'bands': ...} or {'up': ..., 'down': ...}, energies (kpoint x band)"""
+    if 'bands' in data:
+      return {'bands': np.asarray(data['bands'])}
+    return {
+      spin: np.asarray(data.get(spin, data.get(f"bands_{spin}")))
+      for spin in ('up', 'down')
+    }
+
+  @staticmethod
+  def occupations(data: dict) -> dict:
+    """The occupations with the keys of `bands`, None if not read"""
+    if 'occupations' in data:
+      return {'bands': np.asarray(data['occupations'])}
+    if 'occupations_up' in data:
+      return {spin: np.asarray(data[f"occupations_{spin}"]) for spin in ('up', 'down')}
+    return None
+
+  @staticmethod
+  def ticks(distances: np.ndarray, labels: list) -> tuple:
+    """Positions and text of the high-symmetry points"""
+    ticks = {distances[0]: [], distances[-1]: []}
+    for distance, label in zip(distances, labels if labels is not None else []):
+      if label:
+        ticks.setdefault(distance, [])
+        if label not in ticks[distance]:
+          ticks[distance].append(label)
+    tickvals = sorted(ticks)
+    return tickvals, ['|'.join(ticks[value]) for value in tickvals]
+
+  @staticmethod
+  def band_range(bands: dict, window: tuple = (None, None)) -> slice:
+    """The bands reaching into the energy `window`, of any spin
+
+    The energies of every k-point are sorted, so the minimum and maximum 
+    of a band grow with its index and the bands in the window are a range.
+    """
+    lower, upper = window
+    lower = -np.inf if lower is None else lower
+    upper = np.inf if upper is None else upper
+    inside = np.any([
+      (energies.max(axis=0) >= lower) & (energies.min(axis=0) <= upper)
+      for energies in bands.values()
+    ], axis=0)
+    if not inside.any():
+      return slice(0, 0)
+    kept = np.flatnonzero(inside)
+    return slice(int(kept[0]), int(kept[-1]) + 1)
+
+  def to_plotly(
+    self, selection: str = None, width: float = None, source: str = None, 
+    window: tuple = (None, None)
+  ):
+    """Lines for the bands, or one fat-band polygon per band and projection
+
+    Only the bands reaching into the energy `window` are projected and 
+    drawn.
+    """
+    data = self.base
+    width = 0.5 if width is None else width
+    distances = np.asarray(data['kpoint_distances'])
+    bands = self.bands(data)
+    kept = self.band_range(bands, window)
+    bands = {name: energies[:, kept] for name, energies in bands.items()}
+    projections = self.project(selection, (slice(None), kept))
+
+    traces = []
+    if not projections:
+      for name, energies in bands.items():
+        number_bands = energies.shape[1]
+        traces.append(plotly.graph_objs.Scatter(
+          x = np.tile(np.append(distances, np.nan), number_bands),
+          y = np.vstack((energies, np.full(number_bands, np.nan))).T.ravel(),
+          name = name, mode = 'lines',
+        ))
+    else:
+      x = np.concatenate((distances, distances[::-1]))
+      for name, weights in projections.items():
+        energies = bands['down' if name.endswith('down') and 'down' in bands else next(iter(bands))]
+        # like py4vasp, the polygon reaches width * weight above and below
+        half_width = width * weights
+        y = np.concatenate((energies - half_width, (energies + half_width)[::-1]))
+        traces.extend(
+          plotly.graph_objs.Scatter(
+            x = x, y = y[:, band], name = name, legendgroup = name,
+            showlegend = band == 0, mode = 'none', fill = 'toself',
+          )
+          for band in range(y.shape[1])
+        )
+
+    figure = plotly.graph_objs.Figure(data = traces)
+    tickvals, ticktext = self.ticks(distances, data.get('kpoint_labels'))
+    figure.layout.xaxis.tickmode = 'array'
+    figure.layout.xaxis.tickvals = tickvals
+    figure.layout.xaxis.ticktext = ticktext
+    figure.layout.yaxis.title.text = 'Energy (eV)'
+    return figure
+
+
+class ProjectedDos(ProjectedData):
+  QUANTITY = 'dos'
+  PROJECTIONS = 'dos_projections'
+
+  def read(self, selection: str = None, source: str = None) -> dict:
+    # projections named like a total, e.g. 'up, down', are namespaced like 
+    # the flattened band projections, so they don't replace it
+    return {
+      **{
+        f"projections_{label}" if label in self.base else label: value
+        for label, value in self.project(selection).items()
+      },
+      **self.base,
+    }
+
+  @cached_read
+  def integrated_cache(self) -> dict:
+    """{normalized selection: IntegratedDos}, emptied when the file changes"""
+    return {}
+
+  def integrate(self, selection: str = None) -> IntegratedDos:
+    """The integrated total and projected DoS, computed once per selection
+    """
+    key = normalize_selection(selection) if selection else ''
+    if key not in self.integrated_cache:
+      data = self.read(selection)
+      energies = np.asarray(data['energies'])
+      self.integrated_cache[key] = IntegratedDos(energies, {
+        name: value for name, value in data.items() 
+        if name != 'energies' and np.ndim(value) == 1 and len(value) == len(energies)
+      })
+    return self.integrated_cache[key]
+
+  def to_plotly(self, selection: str = None, width: float = None, source: str = None):
+    """Total DoS first, then the projections, spin down drawn negative"""
+    data = self.read(selection)
+    energies = np.asarray(data['energies'])
+    totals = [name for name in ('total', 'up', 'down') if name in self.base]
+    names = totals + [name for name in data if name not in self.base]
+
+    traces = []
+    for name in names:
+      sign = -1 if name.endswith('down') else 1
+      traces.append(plotly.graph_objs.Scatter(
+        x = energies, y = sign * np.asarray(data[name]), name = name,
+        mode = 'lines', fill = 'tozeroy' if name in totals else None,
+      ))
+
+    figure = plotly.graph_objs.Figure(data = traces)
+    figure.layout.xaxis.title.text = 'Energy (eV)'
+    figure.layout.yaxis.title.text = 'DOS (1/eV)'
+    return figure
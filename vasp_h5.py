@@ -12,7 +12,48 @@ from py4vasp import Calculation
 # from py4vasp.raw import File
 from py4vasp.data import Band, Dos
 
+from analysis import (
+  SPIN_MODES, fit_effective_masses, spin_band_edges, 
+  spin_difference, spin_pairs, spin_polarization, 
+)
+from cache import cached_read, clear_read_cache
+from exporter import get_exporter
+from live import ConvergenceFigure, LiveFigure, StepWatcher
 from plotly_object import PlotlyFigure, Line
+from projection import CompiledSelection, ProjectionTensor
+from reader import H5Reader
+from spectrum import IntegratedDos, cumulative, process_spectrum, resample
+from structure_view import ArrowFigure, StructureFigure, moment_vectors
+from trajectory import Trajectory
+from volumetric import (
+  Density, DensityFigure, DensitySliceFigure, component_name, density_reader, 
+  line_profile, planar_average, plane_slice, 
+)
+from vasp_data import ProjectedBand, ProjectedDos
+
+
+def _split_data(data: dict, prefix: str = ''):
+  """Split `data.read()` into {name: array} and {name: metadata}
+
+  Nested dicts, e.g. projections, are flattened to `<key>_<label>`. 
+  Scalars and label lists become metadata.
+  """
+  arrays, metadata = {}, {}
+  for key, value in data.items():
+    name = f"{prefix}{key}"
+    if isinstance(value, dict):
+      sub_arrays, sub_metadata = _split_data(value, f"{name}_")
+      arrays.update(sub_arrays)
+      metadata.update(sub_metadata)
+    elif value is None:
+      continue
+    elif np.ndim(value) == 0:
+      metadata[name] = value
+    elif np.asarray(value).dtype.kind in 'biuf':
+      arrays[name] = np.asarray(value)
+    else:
+      metadata[name] = [str(item) if item else '' for item in value]
+  return arrays, metadata
 
 
 class VaspPlotlyFigure(PlotlyFigure):
@@ -41,6 +82,11 @@ class VaspPlotlyFigure(PlotlyFigure):
     # default, kpoints_opt
     self.k_file = k_file
 
+    # bands outside the energy range (+/- margin) are never projected, the
+    # DoS is cut before styling
+    self.is_pruned = True
+    self.energy_margin = 1.0
+
     self.font.size = 20
 
     # Must init as None type
@@ -66,6 +112,7 @@ class VaspPlotlyFigure(PlotlyFigure):
         selection = self.selection, 
         width = self.bandline.width, 
         # source = self.k_file
+        **self.plotly_options(),
       )
     except Exception:
       self.data: Dos
@@ -116,6 +163,40 @@ class VaspPlotlyFigure(PlotlyFigure):
       pass
       # print(data.name)
 
+  def plotly_options(self) -> dict:
+    """Extra arguments of `data.to_plotly`"""
+    return {}
+
+  def read(self) -> dict:
+    """The numbers behind the figure, using the same selection"""
+    return self.data.read(selection = self.selection)
+
+  def export_chunks(self, arrays: dict, chunk_size: int):
+    """Yield the columns of `arrays` in chunks of about `chunk_size` rows
+    """
+    raise NotImplementedError
+
+  def export(self, path: str, fmt: str = None, chunk_size: int = 65536):
+    """Export the projected data to .npz, .csv or .parquet
+
+    The data is read completely by `read()`, then the table is built and 
+    written chunk by chunk, so no full copy of the table is kept in 
+    memory on top of the data.
+
+    Parameters
+    ----------
+    path : str
+      the output file
+    fmt : str, optional
+      'npz', 'csv' or 'parquet', guessed from `path` by default
+    chunk_size : int
+      the number of rows written at once
+    """
+    arrays, metadata = _split_data(self.read())
+    with get_exporter(path, fmt, metadata) as exporter:
+      for columns in self.export_chunks(arrays, chunk_size):
+        exporter.write(columns)
+
   def show(self):
     self.create_figure()
 
@@ -137,17 +218,43 @@ class VaspPlotlyFigure(PlotlyFigure):
 class BandFigure(VaspPlotlyFigure):
   def __init__(self, data: Band) -> None:
     super().__init__(data)
+    # one trace per projection/spin instead of one per band
+    self.is_merged = False
+    # 'difference' plots the splitting E(up) - E(down) of every band, on 
+    # the y-range `splitting_range` (eV) instead of `yrange`, None autoranges
+    self.spin_mode = None
+    self.splitting_range = (None, None)
+
     self.title = 'Band'
     self.file.name = 'band-plot'
     self.size = (1600, 1200)
+
+  def plotly_options(self) -> dict:
+    """The energy window, bands outside it are neither projected nor drawn
+    """
+    if not self.is_pruned or self.spin_mode:
+      return {}
+    lower, upper = self.yrange
+    return {'window': (
+      None if lower is None else lower - self.energy_margin, 
+      None if upper is None else upper + self.energy_margin, 
+    )}
     
   def create_figure(self):
     super().create_figure()
 
+    if self.spin_mode:
+      self.add_spin_splitting()
+
+    if self.is_merged:
+      self.merge_traces()
+
+    # pruning and merging change the number of traces
+    self.colorscale.len = len(self.figure.data)
     self.colorscale.init()
     for idx, scatter in enumerate(self.figure.data):
       color = self.colorscale.next if not self.line.color else self.line.color
-      if self.selection:
+      if self.selection and not self.spin_mode:
         scatter['fill'] = 'toself'
       scatter['fillcolor'] = color
       scatter['mode'] = 'lines'
@@ -179,6 +286,60 @@ class BandFigure(VaspPlotlyFigure):
       line_color = self.vline.color, 
     )
 
+  def add_spin_splitting(self) -> None:
+    """Replace the bands by their splitting E(up) - E(down)
+
+    Read once, the splitting of all bands is one array subtraction.
+    """
+    if self.spin_mode != 'difference':
+      raise ValueError(f"BandFigure supports spin_mode 'difference', not {self.spin_mode!r}")
+    data = self.read()
+    bands = ProjectedBand.bands(data)
+    if 'down' not in bands:
+      raise ValueError("The spin splitting needs a spin-polarized calculation")
+    splitting = spin_difference(bands['up'], bands['down'])
+    distances = np.asarray(data['kpoint_distances'])
+    number_bands = splitting.shape[1]
+    self.figure.data = []
+    self.figure.add_trace(plotly.graph_objs.Scatter(
+      x = np.tile(np.append(distances, np.nan), number_bands),
+      y = np.vstack((splitting, np.full(number_bands, np.nan))).T.ravel(),
+      name = 'up - down', mode = 'lines',
+    ))
+    self.figure.layout.yaxis.title.text = 'E(up) - E(down) (eV)'
+    # the energy window of the bands doesn't apply to the splitting
+    lower, upper = self.splitting_range
+    if lower is None and upper is None:
+      self.figure.layout.yaxis.range = None
+      self.figure.layout.yaxis.autorange = True
+    else:
+      self.figure.layout.yaxis.range = (
+        np.nanmin(splitting) if lower is None else lower, 
+        np.nanmax(splitting) if upper is None else upper, 
+      )
+    self.colorscale.len = len(self.figure.data)
+
+  def export_chunks(self, arrays: dict, chunk_size: int):
+    """One row per k-point and band: distance, band index, energies and 
+    projection weights
+    """
+    distances = arrays.pop('kpoint_distances')
+    arrays = {
+      key: value for key, value in arrays.items() 
+      if value.ndim == 2 and len(value) == len(distances)
+    }
+    number_bands = max(value.shape[1] for value in arrays.values())
+    step = max(1, chunk_size // number_bands)
+    for start in range(0, len(distances), step):
+      stop = min(start + step, len(distances))
+      columns = {
+        'kpoint_distance': np.repeat(distances[start:stop], number_bands), 
+        'band': np.tile(np.arange(number_bands), stop - start), 
+      }
+      for key, value in arrays.items():
+        columns[key] = value[start:stop].ravel()
+      yield columns
+
 
 class DosFigure(VaspPlotlyFigure):
   def __init__(self, data: Dos) -> None:
@@ -186,6 +347,16 @@ class DosFigure(VaspPlotlyFigure):
     self.is_nototal = False
     self.is_rotated = False
 
+    # FWHM (eV) of an extra 'gaussian'/'lorentzian' broadening, and the 
+    # step (eV) of a new energy grid, used for plotting and export
+    self.broadening = None
+    self.broadening_kind = 'gaussian'
+    self.energy_step = None
+    # dotted integrated DoS of every curve on a second axis
+    self.is_integrated = False
+    # 'difference' (up - down) or 'polarization' ((up - down) / (up + down))
+    self.spin_mode = None
+
     self.title = 'DoS'
     self.file.name = 'dos-plot'
     self.size = (900, 1200)
@@ -194,11 +365,62 @@ class DosFigure(VaspPlotlyFigure):
   def band(self):
     raise TypeError("Dos does't have band")
 
+  @property
+  def is_processed(self) -> bool:
+    return bool(self.broadening or self.energy_step)
+
+  def process(self, energies: np.ndarray, values: np.ndarray) -> tuple:
+    """Broaden and resample the curves (curve x energy) all at once"""
+    return process_spectrum(
+      energies, values, 
+      self.broadening, self.broadening_kind, self.energy_step
+    )
+
+  def read(self) -> dict:
+    data = super().read()
+    if not self.is_processed:
+      return data
+    energies = np.asarray(data['energies'])
+    names = [
+      name for name, value in data.items() 
+      if name != 'energies' and np.ndim(value) == 1 and len(value) == len(energies)
+    ]
+    energies, values = self.process(energies, [data[name] for name in names])
+    return {**data, 'energies': energies, **dict(zip(names, values))}
+
   def create_figure(self):
     super().create_figure()
 
-    if self.is_nototal and self.selection != 'up, down':
-      self.figure.data = self.figure.data[2:]
+    if self.is_processed:
+      # every trace shares the energies on x until rotated
+      energies, values = self.process(
+        self.figure.data[0].x, [scatter.y for scatter in self.figure.data]
+      )
+      for scatter, value in zip(self.figure.data, values):
+        scatter.x, scatter.y = energies, value
+
+    if self.spin_mode:
+      self.combine_spins()
+
+    # integrate before pruning, so the counts start at the lowest energy
+    integrated = {
+      scatter.name: (np.asarray(scatter.x), cumulative(scatter.x, scatter.y))
+      for scatter in self.figure.data
+    } if self.is_integrated else {}
+
+    if self.is_pruned:
+      # energies are on x axis until rotated
+      self.prune_traces(
+        'x', 
+        self.yrange if self.is_rotated else self.xrange, 
+        self.energy_margin, 
+        pointwise = True
+      )
+      self.colorscale.len = len(self.figure.data)
+
+    if self.is_nototal:
+      # the totals are combined into one trace in a spin mode
+      self.figure.data = self.figure.data[1 if self.spin_mode else 2:]
 
     if self.is_rotated:
       (
@@ -271,6 +493,84 @@ class DosFigure(VaspPlotlyFigure):
       else:
         self.figure.layout.yaxis.range = (dos_min, dos_max)
 
+    # after the range above, which is for the DoS only
+    if integrated:
+      self.add_integrated_traces(integrated)
+
+  def combine_spins(self) -> None:
+    """Replace every up/down pair of traces by their difference or 
+    polarization, computed for all pairs at once
+    """
+    if self.spin_mode not in SPIN_MODES:
+      raise ValueError(f"Unknown spin_mode {self.spin_mode!r}, use one of {SPIN_MODES}")
+    traces = {scatter.name: scatter for scatter in self.figure.data}
+    pairs = spin_pairs(traces)
+    if not pairs:
+      raise ValueError("The spin modes need a spin-polarized calculation")
+    paired = {name for pair in pairs.values() for name in pair}
+    # spin down is drawn negative
+    up, down = (
+      np.abs([traces[pair[spin]].y for pair in pairs.values()]) for spin in (0, 1)
+    )
+    if self.spin_mode == 'difference':
+      values, title = spin_difference(up, down), 'DOS up - down (1/eV)'
+    else:
+      values, title = spin_polarization(up, down), 'Spin polarization'
+    energies = self.figure.data[0].x
+    unpaired = [scatter for scatter in self.figure.data if scatter.name not in paired]
+    self.figure.data = []
+    self.figure.add_traces([
+      plotly.graph_objs.Scatter(
+        x = energies, y = value, name = label, mode = 'lines',
+        fill = 'tozeroy' if label == 'total' else None,
+      )
+      for label, value in zip(pairs, values)
+    ] + unpaired)
+    self.figure.layout.yaxis.title.text = title
+    self.colorscale.len = len(self.figure.data)
+
+  def add_integrated_traces(self, integrated: dict) -> None:
+    """Dotted integrated DoS of every trace on a second DoS axis
+
+    Parameters
+    ----------
+    integrated : dict
+      {name: (energies, integrated DoS)} of the traces before pruning
+    """
+    energy_axis, dos_axis = ('y', 'x') if self.is_rotated else ('x', 'y')
+    for scatter in list(self.figure.data):
+      if scatter.name not in integrated:
+        continue
+      energies, values = integrated[scatter.name]
+      shown = np.asarray(scatter[energy_axis], dtype=float)
+      self.figure.add_trace(plotly.graph_objs.Scatter({
+        energy_axis: shown,
+        dos_axis: np.interp(shown, energies, values),
+        f"{dos_axis}axis": f"{dos_axis}2",
+        'name': f"∫{scatter.name}",
+        'mode': 'lines',
+        'line': {'width': scatter.line.width, 'color': scatter.line.color, 'dash': 'dot'},
+      }))
+    self.figure.layout[f"{dos_axis}axis2"] = {
+      'overlaying': dos_axis,
+      'side': 'top' if self.is_rotated else 'right',
+      'title': {'text': 'Integrated DoS'},
+      'showgrid': False,
+    }
+
+  def export_chunks(self, arrays: dict, chunk_size: int):
+    """One row per energy: energy, total and projected DoS"""
+    energies = arrays.pop('energies')
+    arrays = {
+      key: value for key, value in arrays.items() 
+      if value.ndim == 1 and len(value) == len(energies)
+    }
+    for start in range(0, len(energies), chunk_size):
+      columns = {'energy': energies[start:start + chunk_size]}
+      for key, value in arrays.items():
+        columns[key] = value[start:start + chunk_size]
+      yield columns
+
 
 # class Data:
 #   def __init__(self, file: File) -> None:
@@ -305,11 +605,16 @@ class Result:
     #####################################################################
 
     self.calc = Calculation.from_path(path_to_h5file)
+    self.reader = H5Reader(path_to_h5file)
+
+    # projections are summed from tensors loaded once, see `band_projection`
+    self.band_data = ProjectedBand(self.calc, self.reader)
+    self.dos_data = ProjectedDos(self.calc, self.reader)
     
-    self.bandfig = BandFigure(data = self.calc.band, mathjax_path = mathjax_path)
-    self.dosfig = DosFigure(self.calc.dos, mathjax_path = mathjax_path)
+    self.bandfig = BandFigure(data = self.band_data, mathjax_path = mathjax_path)
+    self.dosfig = DosFigure(self.dos_data, mathjax_path = mathjax_path)
 
-    self.thin_bandfig = BandFigure(self.calc.band, mathjax_path = mathjax_path)
+    self.thin_bandfig = BandFigure(self.band_data, mathjax_path = mathjax_path)
     # self.thin_bandfig.colorscale.alpha = 1
     self.thin_bandfig.bandline.width = 1e-9
     self.thin_bandfig.file.name = 'thin_band-plot'
@@ -318,7 +623,75 @@ class Result:
     # Wait for downloading figures 
     time.sleep(2)
 
-  @property
+  def refresh(self) -> None:
+    """Drop every cached read, the next access reads vaspout.h5 again
+
+    Not needed when VASP rewrites the file, a change of its modification 
+    time or size is detected automatically.
+    """
+    for instance in (self, self.band_data, self.dos_data):
+      clear_read_cache(instance)
+
+  def watch(
+    self, 
+    interval: float = 10, timeout: float = None, use_browser: str = 'chrome'
+  ) -> LiveFigure:
+    """Follow a running calculation and plot every new ionic step
+
+    Only the steps appended to vaspout.h5 since the last poll are read, 
+    and they are pushed to the open page without reloading it. Stop with 
+    Ctrl+C or after `timeout`.
+
+    Parameters
+    ----------
+    interval : float
+      seconds between two polls of vaspout.h5
+    timeout : float, optional
+      seconds after which watching stops, None watches until interrupted
+    use_browser : str
+      the browser (driven by selenium) that shows the page
+
+    Returns
+    -------
+    LiveFigure
+      the figure with all steps read
+    """
+    watcher = StepWatcher(self.reader)
+    figure = LiveFigure(watcher.poll(), use_browser = use_browser)
+    figure.title = self.path
+    figure.reload_interval = interval
+    figure.plot()
+
+    start = time.time()
+    try:
+      while timeout is None or time.time() - start < timeout:
+        time.sleep(interval)
+        new = watcher.poll()
+        if new:
+          figure.push(new)
+    except KeyboardInterrupt:
+      pass
+    return figure
+
+  def convergence_figure(self, steps: slice = slice(None)) -> ConvergenceFigure:
+    """Energy, max force, pressure and total moment per ionic step
+
+    All four come from one batched read, see `trajectory_derived`; use 
+    `show()`/`plot()` of the returned figure.
+
+    Parameters
+    ----------
+    steps : slice
+      the ionic steps shown, e.g. `slice(1000, None, 10)`
+    """
+    trajectory = self.trajectory
+    if steps != slice(None):
+      trajectory = trajectory[steps]
+    figure = ConvergenceFigure.from_trajectory(trajectory)
+    figure.title = self.path
+    return figure
+
+  @cached_read(filename = 'INCAR')
   def INCAR(self):
     return self.calc.INCAR.read()
 
@@ -365,7 +738,7 @@ class Result:
     """
     return self.calc.INCAR.write(string)
 
-  @property
+  @cached_read(filename = 'POSCAR')
   def POSCAR(self):
     return self.calc.POSCAR.read()
 
@@ -415,7 +788,7 @@ class Result:
     """
     return self.calc.POSCAR.write(string)
 
-  @property
+  @cached_read(filename = 'KPOINTS')
   def KPOINTS(self):
     return self.calc.KPOINTS.read()
 
@@ -462,11 +835,46 @@ class Result:
     """
     return self.calc.KPOINTS.write(string)
 
+  @cached_read
+  def band_edges(self) -> dict:
+    """Band gap, VBM and CBM per spin, from the cached band energies
+
+    Returns
+    -------
+    dict
+      {'bands': BandEdges} or {'up': ..., 'down': ..., 'total': ...}, see 
+      `analysis.band_edges`
+    """
+    data = self.band_data.base
+    return spin_band_edges(
+      ProjectedBand.bands(data), data.get('kpoint_labels'), 
+      occupations = ProjectedBand.occupations(data)
+    )
+
+  @property
+  def band_projection(self) -> ProjectionTensor:
+    """Band projections (spin x atom x orbital x kpoint x band), loaded once
+
+    The sums over the atoms of each element and over the orbitals of each 
+    angular momentum are precomputed.
+    """
+    return self.band_data.tensor
+
+  def band_project(self, selection: str) -> dict:
+    """Project the bands onto `selection`, e.g. 'up(V(dxy, dyz))'
+
+    Returns
+    -------
+    dict
+      {label: np.ndarray (kpoint x band)}
+    """
+    return self.band_data.project(selection)
+
   @property
   def born_effective_charge(self):
     raise NotImplementedError
 
-  @property
+  @cached_read
   def density(self):
     return self.calc.density.read()
 
@@ -476,8 +884,112 @@ class Result:
   @property
   def density_plot(self):
     return self.calc.density.plot()
+
+  @cached_read
+  def density_lattice_vectors(self) -> np.ndarray:
+    if len(self.trajectory):
+      return self.trajectory[-1]['lattice_vectors']
+    return np.asarray(self.structure['lattice_vectors'])
+
+  @cached_read
+  def density_grids(self) -> np.ndarray:
+    """All components of the density (component x z x y x) as written by 
+    VASP, memory-mapped from vaspout.h5 or vaspwave.h5
+    """
+    return density_reader(self.reader.path).memmap('density')
+
+  def density_grid(self, component: int = 0) -> np.ndarray:
+    """Component 0 (charge) or 1 (magnetization, 1-3 if noncollinear) as 
+    (x, y, z), memory-mapped
+    """
+    return self.density_grids[component].T
+
+  @cached_read
+  def density_volume(self) -> Density:
+    """The charge density with its cached downsampled grids and isosurfaces"""
+    return Density(self.density_grid(0), self.density_lattice_vectors)
+
+  def density_slice(
+    self, 
+    origin: tuple = (0, 0, 0), u: tuple = (1, 0, 0), v: tuple = (0, 1, 0), 
+    shape: tuple = (100, 100), component: int = 0
+  ) -> dict:
+    """The density on the plane origin + s u + t v (fractional), 
+    interpolated trilinearly, see `volumetric.plane_slice`
+    """
+    return plane_slice(
+      self.density_grid(component), self.density_lattice_vectors, origin, u, v, shape
+    )
+
+  def density_planar_average(self, axis: int = 2, component: int = 0) -> dict:
+    """The density averaged over the planes normal to lattice vector `axis`, 
+    e.g. along z of a slab
+    """
+    return planar_average(self.density_grid(component), self.density_lattice_vectors, axis)
+
+  def density_line_profile(
+    self, start: tuple, end: tuple, points: int = 200, component: int = 0
+  ) -> dict:
+    """The density from `start` to `end` (fractional), interpolated trilinearly"""
+    return line_profile(
+      self.density_grid(component), self.density_lattice_vectors, start, end, points
+    )
+
+  def density_slice_figure(
+    self, 
+    origin: tuple = (0, 0, 0), u: tuple = (1, 0, 0), v: tuple = (0, 1, 0), 
+    shape: tuple = (100, 100), component: int = 0
+  ) -> DensitySliceFigure:
+    """Heatmap of `density_slice`"""
+    figure = DensitySliceFigure(self.density_slice(origin, u, v, shape, component))
+    figure.title = f"{self.system} {component_name(component, len(self.density_grids))}"
+    figure.xtitle = f"Distance along {tuple(u)} (Å)"
+    figure.ytitle = f"Distance normal to {tuple(u)} (Å)"
+    figure.is_diverging = component > 0
+    return figure
+
+  def density_profile_figure(
+    self, 
+    axis: int = 2, start: tuple = None, end: tuple = None, 
+    points: int = 200, component: int = 0
+  ) -> DensitySliceFigure:
+    """Line of `density_line_profile` if `start` and `end` are given, of 
+    `density_planar_average` along `axis` otherwise
+    """
+    name = component_name(component, len(self.density_grids))
+    if start is None or end is None:
+      figure = DensitySliceFigure(self.density_planar_average(axis, component))
+      figure.title = f"{self.system} planar average {name}"
+      figure.xtitle = f"Distance along {'abc'[axis]} (Å)"
+    else:
+      figure = DensitySliceFigure(self.density_line_profile(start, end, points, component))
+      figure.title = f"{self.system} {name}"
+      figure.xtitle = f"Distance from {tuple(start)} (Å)"
+    figure.ytitle = name.capitalize()
+    figure.file.name = 'density-profile-plot'
+    return figure
+
+  def density_figure(
+    self, isovalues: list, resolution: float = 0.3, opacity: float = 0.5
+  ) -> DensityFigure:
+    """Isosurfaces of the charge density, block-averaged to `resolution`
+
+    Parameters
+    ----------
+    isovalues : list
+      one surface per value, in the units of the density
+    resolution : float
+      grid spacing in Å, None keeps the FFT grid
+    opacity : float
+    """
+    figure = DensityFigure(self.density_volume)
+    figure.title = self.system
+    figure.isovalues = list(np.atleast_1d(isovalues))
+    figure.resolution = resolution
+    figure.opacity = opacity
+    return figure
     
-  @property
+  @cached_read
   def dielectric_function(self):
     return self.calc.dielectric_function.read()
 
@@ -488,24 +1000,118 @@ class Result:
   def dielectric_tensor(self):
     raise NotImplementedError
 
+  @property
+  def dos_projection(self) -> ProjectionTensor:
+    """DoS projections (spin x atom x orbital x energy), loaded once"""
+    return self.dos_data.tensor
+
+  def dos_integrate(self, selection: str = None) -> IntegratedDos:
+    """The integrated DoS of the totals and of `selection`, cached
+
+    Returns
+    -------
+    IntegratedDos
+      e.g. `r.dos_integrate('V(d)').count()` electrons up to the Fermi 
+      energy, `.count(energies)` at many energies at once
+    """
+    return self.dos_data.integrate(selection)
+
+  def dos_spin_polarization(self, selection: str = None, energy: float = 0.0) -> dict:
+    """Spin polarization (up - down) / (up + down) of the DoS at `energy`
+
+    Parameters
+    ----------
+    selection : str, optional
+      the projections, e.g. 'V(d)', the total is always included
+    energy : float
+      relative to the Fermi energy
+
+    Returns
+    -------
+    dict
+      {'total': P, label: P, ...}
+    """
+    data = self.dos_data.read(selection)
+    pairs = spin_pairs([name for name in data if np.ndim(data[name]) == 1])
+    if not pairs:
+      return {}
+    up, down = (
+      resample(data['energies'], [data[pair[spin]] for pair in pairs.values()], [energy])[:, 0]
+      for spin in (0, 1)
+    )
+    return dict(zip(pairs, spin_polarization(up, down).tolist()))
+
+  def dos_project(self, selection: str) -> dict:
+    """Project the DoS onto `selection`, e.g. 'V(d)'
+
+    Returns
+    -------
+    dict
+      {label: np.ndarray (energy)}
+    """
+    return self.dos_data.project(selection)
+
+  @cached_read
+  def effective_masses(self) -> list:
+    """Parabolic effective masses at the VBM/CBM along every path segment
+
+    Call `analysis.fit_effective_masses` on `band_data.base` for other fit
+    settings, e.g. a non-parabolic fit.
+
+    Returns
+    -------
+    list
+      EffectiveMass per spin, edge, band and segment
+    """
+    data = self.band_data.base
+    return fit_effective_masses(
+      ProjectedBand.bands(data), data['kpoint_distances'], data.get('kpoint_labels'), 
+      occupations = ProjectedBand.occupations(data)
+    )
+
   @property
   def elastic_modulus(self):
     raise NotImplementedError
   
-  @property
+  @cached_read
   def energy(self):
     return self.calc.energy.read()
 
   def energy_print(self):
     return self.calc.energy.print()
 
-  @property
+  @cached_read
   def force(self):
     return self.calc.force.read()
 
   def force_print(self):
     return self.calc.force.print()
 
+  def force_figure(self, step: int = -1, threshold: float = 0.0, scale: float = None) -> ArrowFigure:
+    """The forces of ionic step `step` as arrows, batched in two traces
+
+    Parameters
+    ----------
+    step : int
+      the ionic step, only this one is read
+    threshold : float
+      forces smaller than this (eV/Å) are left out
+    scale : float, optional
+      Å per eV/Å, `force_rescale` by default
+    """
+    frame = self.trajectory[step]
+    figure = ArrowFigure({
+      'positions': frame['positions'],
+      'lattice_vectors': frame['lattice_vectors'],
+      'elements': self.topology_elements,
+      'vectors': frame['forces'],
+    })
+    figure.title = 'Forces'
+    figure.file.name = 'force-plot'
+    figure.threshold = threshold
+    figure.scale = self.force_rescale if scale is None else scale
+    return figure
+
   @property
   def force_plot(self):
     return self.calc.force.plot()
@@ -522,11 +1128,11 @@ class Result:
   def internal_strain(self):
     raise NotImplementedError
 
-  @property
+  @cached_read
   def kpoint_distances(self):
     return self.calc.kpoint.distances()
 
-  @property
+  @cached_read
   def kpoint_labels(self):
     return list({ 
       label 
@@ -534,46 +1140,74 @@ class Result:
       if label
     })
   
-  @property
+  @cached_read
   def kpoint_line_length(self):
     return self.calc.kpoint.line_length()
 
-  @property
+  @cached_read
   def kpoint_mode(self):
     return self.calc.kpoint.mode()
 
-  @property
+  @cached_read
   def kpoint_number_lines(self):
     return self.calc.kpoint.number_lines()
 
-  @property
+  @cached_read
   def magnetism(self):
     return self.calc.magnetism.read()
 
   def magnetism_print(self):
     return self.calc.magnetism.print()
 
+  def magnetism_figure(self, step: int = -1, threshold: float = 0.0, scale: float = 1.0) -> ArrowFigure:
+    """The magnetic moments of ionic step `step` as arrows, collinear 
+    moments along z, batched in two traces
+
+    Parameters
+    ----------
+    step : int
+      the ionic step, only this one is read
+    threshold : float
+      moments smaller than this (μB) are left out
+    scale : float
+      Å per μB
+    """
+    frame = self.trajectory[step]
+    if 'spin_moments' not in frame:
+      raise ValueError(f"No magnetic moments in {self.reader.path}, the run isn't spin polarized")
+    figure = ArrowFigure({
+      'positions': frame['positions'],
+      'lattice_vectors': frame['lattice_vectors'],
+      'elements': self.topology_elements,
+      'vectors': moment_vectors(frame['spin_moments']),
+    })
+    figure.title = 'Magnetic moments'
+    figure.file.name = 'magnetism-plot'
+    figure.threshold = threshold
+    figure.scale = scale
+    return figure
+
   @property
   def magnetism_plot(self):
     return self.calc.magnetism.plot()
 
-  @property
+  @cached_read
   def magnetism_charges(self):
     return self.calc.magnetism.charges()
   
-  @property
+  @cached_read
   def magnetism_length_moments(self):
     return self.calc.magnetism.length_moments
   
-  @property
+  @cached_read
   def magnetism_moments(self):
     return self.calc.magnetism.moments()
   
-  @property
+  @cached_read
   def magnetism_total_charges(self):
     return self.calc.magnetism.total_charges()
   
-  @property
+  @cached_read
   def magnetism_total_moments(self):
     return self.calc.magnetism.total_moments()
 
@@ -589,7 +1223,7 @@ class Result:
   def polarization(self):
     raise NotImplementedError
   
-  @property
+  @cached_read
   def projector(self):
     return self.calc.projector.read()
 
@@ -629,6 +1263,21 @@ class Result:
 
     return self.calc.projector.parse_selection(selection)
 
+  def compile_selection(self, selection: str) -> CompiledSelection:
+    """Parse and resolve `selection` once for band and DoS projections
+
+    The result is cached by the normalized selection string and shared by 
+    `bandfig`, `thin_bandfig`, `dosfig` and every Result with the same 
+    atoms, orbitals and spins.
+
+    Examples
+    --------
+    >>> compiled = r.compile_selection('up(V(dxy, dyz))')
+    >>> compiled(r.band_projection)
+    {'V_dxy_up': array(...), 'V_dyz_up': array(...)}
+    """
+    return self.band_projection.compile(selection)
+
   def projector_print(self):
     return self.calc.projector.print()
 
@@ -678,22 +1327,22 @@ class Result:
 
     return self.calc.projector.select(atom, orbital, spin)
 
-  @property
+  @cached_read
   def stress(self):
     return self.calc.stress.read()
 
   def stress_print(self):
     return self.calc.stress.print()
   
-  @property
+  @cached_read
   def structure(self):
     return self.calc.structure.read()
   
-  @property
+  @cached_read
   def structure_to_POSCAR(self):
     return self.calc.structure.to_POSCAR()
 
-  @property
+  @cached_read
   def structure_to_ase(self):
     return self.calc.structure.to_POSCAR()
 
@@ -703,63 +1352,99 @@ class Result:
   def structure_plot(self):
     return self.calc.structure.plot()
 
-  @property
+  @cached_read
   def structure_cartisian_position(self):
     return self.calc.structure.cartesian_positions()
     
-  @property
+  @cached_read
   def structure_number_atoms(self):
     return self.calc.structure.number_atoms()
 
-  @property
+  @cached_read
   def structure_number_steps(self):
-    return self.calc.structure.number_steps()
+    # from the dataset shapes, the structure isn't read; a single point 
+    # calculation without ionic steps has one structure
+    return len(self.trajectory) or self.calc.structure.number_steps()
 
-  @property
+  def structure_figure(self, step: int = -1) -> StructureFigure:
+    """Atoms, bonds and cell of ionic step `step` in a few traces
+
+    Only that step is read, the bonds are found with a cell list, so 
+    large supercells stay interactive; use `show()`/`plot()` of the 
+    returned figure.
+    """
+    if len(self.trajectory):
+      frame = self.trajectory[step]
+      data = {
+        'positions': frame['positions'],
+        'lattice_vectors': frame['lattice_vectors'],
+        'elements': self.topology_elements,
+      }
+    else:
+      data = self.structure
+    figure = StructureFigure(data)
+    figure.title = self.system
+    return figure
+
+  @cached_read
   def structure_volume(self):
     return self.calc.structure.volume()
 
-  @property
+  @cached_read
   def system(self):
     return self.calc.system.__str__()
 
   def system_print(self):
     return self.calc.system.print()
 
-  @property
+  @cached_read
   def topology(self):
     return self.calc.topology.read()
 
   def topology_print(self):
     return self.calc.topology.print()
 
-  @property
+  @cached_read
   def topology_to_frame(self):
     return self.calc.topology.to_frame()
 
-  @property
+  @cached_read
   def topology_to_mdtraj(self):
     return self.calc.topology.to_mdtraj()
     
-  @property
+  @cached_read
   def topology_to_poscar(self):
     return self.calc.topology.to_poscar()
 
-  @property
+  @cached_read
   def topology_elements(self):
     return self.calc.topology.elements()
 
-  @property
+  @cached_read
   def topology_ion_types(self):
     return self.calc.topology.ion_types()
 
-  @property
+  @cached_read
   def topology_names(self):
     return self.calc.topology.names()
 
-  @property
+  @cached_read
   def topology_number_atoms(self):
     return self.calc.topology.number_atoms()
+
+  @cached_read
+  def trajectory(self) -> Trajectory:
+    """All ionic steps, lazy, e.g. `r.trajectory[1000:2000:10].read()`"""
+    return Trajectory(self.reader)
+
+  @cached_read
+  def trajectory_derived(self) -> dict:
+    """Per-step energy, volume, lattice parameters, max force, pressure 
+    and moment lengths of all steps, see `Trajectory.derived`
+
+    Slices compute their own, e.g. `r.trajectory[::10].derived()`.
+    """
+    return self.trajectory.derived()
   
 
 def dev_result_self_check(
@@ -791,6 +1476,8 @@ def dev_result_self_check(
   # print(f"{r.density=}\n")
   # print(f"{r.density_plot=}\n")
   # print(f"{r.density_print=}\n")
+  # print(f"{r.density_volume=}\n")
+  # print(f"{r.density_planar_average(axis=2)=}\n")
   # print(f"{r.dielectric_function=}\n")
   # print(f"{r.dielectric_function_print=}\n")
   # print(f"{r.dielectric_tensor=}\n")
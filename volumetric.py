@@ -0,0 +1,445 @@
+"""Downsampled volumetric density, cached isosurfaces, slices and profiles
+
+The density grid is block-averaged to a target resolution before an
+isosurface is extracted, the extraction is a vectorized marching
+tetrahedra over all cells of the grid at once. Grids and meshes are
+cached per resolution and isovalue, so changing the view doesn't
+recompute them.
+
+Slices, planar averages and line profiles work on the memory-mapped
+grid, a slice only reads the pages around its points.
+
+Example
+-------
+>>> from vasp_h5 import Result
+>>> r = Result("/path/to/calculation")
+>>> figure = r.density_figure(isovalues=[0.05, 0.2], resolution=0.3)
+>>> figure.plot()
+>>> r.density_slice_figure(origin=(0, 0, 0.5), component=1).plot()
+>>> r.density_profile_figure(axis=2).plot()    # planar average along c
+"""
+
+import os
+
+import numpy as np
+import plotly
+
+from plotly_object import PlotlyFigure
+from reader import H5Reader
+from structure_view import _CELL_EDGES, _segments
+
+
+# the density moved to vaspwave.h5 in newer VASP versions
+DENSITY_FILES = (H5Reader.FILENAME, 'vaspwave.h5')
+
+
+def density_reader(path: str) -> H5Reader:
+  """The reader of the file next to `path` that contains the density"""
+  folder = path if os.path.isdir(path) else os.path.dirname(path)
+  for filename in DENSITY_FILES:
+    reader = H5Reader(os.path.join(folder, filename))
+    if os.path.isfile(reader.path) and reader.exists('density'):
+      return reader
+  raise KeyError(f"No density in {[os.path.join(folder, name) for name in DENSITY_FILES]}")
+
+
+def block_average(grid: np.ndarray, factors: tuple) -> np.ndarray:
+  """Average blocks of `factors` points of a periodic grid (x, y, z)
+
+  A grid not divisible by a factor is extended periodically.
+  """
+  padding = [(0, -size % factor) for size, factor in zip(grid.shape, factors)]
+  grid = np.pad(grid, padding, mode='wrap')
+  shape = [
+    part for size, factor in zip(grid.shape, factors) for part in (size // factor, factor)
+  ]
+  return grid.reshape(shape).mean(axis=(1, 3, 5))
+
+
+def block_centers(size: int, factor: int) -> np.ndarray:
+  """Fractional positions of the blocks of `block_average` along one axis
+
+  Block i averages the points i f ... i f + f - 1, its centre lies at
+  (i f + (f - 1) / 2) / size. The last entry is the first block of the
+  next cell, a padded last block is closer to it than the others.
+
+  Returns
+  -------
+  np.ndarray
+    (block + 1) positions
+  """
+  number = -(-size // factor)
+  centers = (np.arange(number) * factor + (factor - 1) / 2) / size
+  return np.append(centers, centers[0] + 1)
+
+
+# the corners of a cell as (i, j, k) offsets, corner c has the bits of c
+_CORNERS = np.array([(c & 1, c >> 1 & 1, c >> 2 & 1) for c in range(8)])
+# the six tetrahedra around the diagonal 0-7 of a cell, shared faces of
+# neighbouring cells are split the same way
+_TETRAHEDRA = np.array([
+  (0, 1, 3, 7), (0, 1, 5, 7), (0, 2, 3, 7), (0, 2, 6, 7), (0, 4, 5, 7), (0, 4, 6, 7),
+])
+
+
+def _triangles(case: int) -> list:
+  """Triangles, as edges (pairs of tetrahedron corners), of a case
+
+  The bit c of `case` is set if corner c lies above the isovalue.
+  """
+  above = [corner for corner in range(4) if case >> corner & 1]
+  below = [corner for corner in range(4) if not case >> corner & 1]
+  if len(above) in (1, 3):
+    lone, others = (above, below) if len(above) == 1 else (below, above)
+    return [[(lone[0], other) for other in others]]
+  if len(above) == 2:
+    (a, b), (c, d) = above, below
+    return [[(a, c), (a, d), (b, d)], [(a, c), (b, d), (b, c)]]
+  return []
+
+
+_CASES = {case: _triangles(case) for case in range(16)}
+
+
+def marching_tetrahedra(grid: np.ndarray, isovalue: float, centers: tuple = None) -> tuple:
+  """Triangles of the isosurface of a periodic grid (x, y, z)
+
+  Parameters
+  ----------
+  centers : tuple, optional
+    per axis the fractional positions of the points and of the first 
+    point of the next cell, see `block_centers`, by default point i of 
+    an axis with n points lies at i / n
+
+  Returns
+  -------
+  tuple
+    (vertices (vertex x 3) in fractional coordinates, faces (face x 3))
+  """
+  shape = np.array(grid.shape)
+  # close the surface across the periodic boundary
+  closed = np.pad(grid, [(0, 1)] * 3, mode='wrap')
+  cells = np.stack(np.meshgrid(*map(np.arange, shape), indexing='ij'), axis=-1).reshape(-1, 3)
+
+  triangles = []
+  for tetrahedron in _TETRAHEDRA:
+    points = cells[:, None, :] + _CORNERS[tetrahedron]            # (cell x 4 x 3)
+    values = closed[points[..., 0], points[..., 1], points[..., 2]]  # (cell x 4)
+    cases = ((values > isovalue) << np.arange(4)).sum(axis=1)
+    for case in np.unique(cases):
+      selected = cases == case
+      for triangle in _CASES[case]:
+        first, second = np.array(triangle).T
+        v1, v2 = values[selected][:, first], values[selected][:, second]
+        p1, p2 = points[selected][:, first], points[selected][:, second]
+        t = ((isovalue - v1) / (v2 - v1))[..., None]
+        triangles.append(p1 + t * (p2 - p1))                   # (face x 3 x 3)
+  if not triangles:
+    return np.zeros((0, 3)), np.zeros((0, 3), dtype=int)
+
+  if centers is None:
+    centers = [np.arange(size + 1) / size for size in shape]
+  # linear in every cell, so mapping the vertices is exact
+  corners = np.concatenate(triangles).reshape(-1, 3)
+  corners = np.stack([
+    np.interp(corners[:, axis], np.arange(len(centers[axis])), centers[axis])
+    for axis in range(3)
+  ], axis=-1)
+  vertices, faces = np.unique(corners.round(9), axis=0, return_inverse=True)
+  return vertices, faces.reshape(-1, 3)
+
+
+def component_name(component: int, number_components: int) -> str:
+  """'charge' for 0, 'magnetization' (x, y, z if noncollinear) otherwise"""
+  if component == 0:
+    return 'charge'
+  if number_components == 2:
+    return 'magnetization'
+  return f"magnetization {'xyz'[component - 1]}"
+
+
+def trilinear(grid: np.ndarray, fractional: np.ndarray) -> np.ndarray:
+  """Periodic trilinear interpolation of a grid (x, y, z)
+
+  Point i of an axis with n points lies at i / n. `grid` may be
+  memory-mapped, only the 8 neighbours of every point are read.
+
+  Parameters
+  ----------
+  fractional : np.ndarray
+    (... x 3) fractional coordinates
+
+  Returns
+  -------
+  np.ndarray
+    (...) the interpolated values
+  """
+  shape = np.array(grid.shape)
+  position = np.asarray(fractional, dtype=float) * shape
+  lower = np.floor(position).astype(int)
+  weight = position - lower
+  values = np.zeros(position.shape[:-1])
+  for corner in _CORNERS:
+    index = (lower + corner) % shape
+    values += (
+      np.prod(np.where(corner, weight, 1 - weight), axis=-1)
+      * grid[index[..., 0], index[..., 1], index[..., 2]]
+    )
+  return values
+
+
+def plane_slice(
+  grid: np.ndarray, lattice_vectors: np.ndarray,
+  origin: tuple = (0, 0, 0), u: tuple = (1, 0, 0), v: tuple = (0, 1, 0),
+  shape: tuple = (100, 100)
+) -> dict:
+  """The grid on the plane origin + s u + t v, 0 <= s, t <= 1
+
+  The plane is sampled on a rectangular grid of Cartesian coordinates, x
+  along u and y normal to u in the plane, so it keeps its shape when u
+  and v aren't orthogonal, e.g. in hexagonal cells. Points outside the
+  parallelogram spanned by u and v are NaN.
+
+  Parameters
+  ----------
+  origin, u, v : tuple
+    fractional coordinates, u and v span the plane
+  shape : tuple
+    number of points along x and y
+
+  Returns
+  -------
+  dict
+    {'x': (x) Å along u, 'y': (y) Å normal to u, 'values': (x x y)}
+  """
+  origin, u, v = (np.asarray(vector, dtype=float) for vector in (origin, u, v))
+  # u and v in the orthonormal basis of the plane, u along x
+  cartesian_u, cartesian_v = u @ lattice_vectors, v @ lattice_vectors
+  ux = np.linalg.norm(cartesian_u)
+  vx = cartesian_v @ cartesian_u / ux
+  vy = np.sqrt(max(cartesian_v @ cartesian_v - vx**2, 0))
+  x = np.linspace(min(0, vx), max(ux, ux + vx), shape[0])
+  y = np.linspace(0, vy, shape[1])
+  t = np.broadcast_to(y[None, :] / vy, (len(x), len(y)))
+  s = (x[:, None] - t * vx) / ux
+  inside = (s > -1e-9) & (s < 1 + 1e-9)
+  values = np.full(inside.shape, np.nan)
+  values[inside] = trilinear(grid, origin + s[inside][:, None] * u + t[inside][:, None] * v)
+  return {'x': x, 'y': y, 'values': values}
+
+
+def planar_average(grid: np.ndarray, lattice_vectors: np.ndarray, axis: int = 2) -> dict:
+  """The grid averaged over the planes normal to lattice vector `axis`
+
+  Returns
+  -------
+  dict
+    {'x': (point) Å along the lattice vector, 'values': (point)}
+  """
+  number = grid.shape[axis]
+  return {
+    'x': np.arange(number) / number * np.linalg.norm(lattice_vectors[axis]),
+    'values': np.asarray(grid.mean(axis=tuple({0, 1, 2} - {axis}))),
+  }
+
+
+def line_profile(
+  grid: np.ndarray, lattice_vectors: np.ndarray,
+  start: tuple, end: tuple, points: int = 200
+) -> dict:
+  """The grid along the line from `start` to `end` (fractional)
+
+  Returns
+  -------
+  dict
+    {'x': (point) Å from `start`, 'values': (point)}
+  """
+  start, end = np.asarray(start, dtype=float), np.asarray(end, dtype=float)
+  t = np.linspace(0, 1, points)
+  return {
+    'x': t * np.linalg.norm((end - start) @ lattice_vectors),
+    'values': trilinear(grid, start + t[:, None] * (end - start)),
+  }
+
+
+class Density:
+  """A density grid with cached downsampled grids and isosurfaces
+
+  Parameters
+  ----------
+  grid : np.ndarray
+    the density on the FFT grid (x, y, z)
+  lattice_vectors : np.ndarray
+    (3 x 3) in Å
+  """
+  def __init__(self, grid: np.ndarray, lattice_vectors: np.ndarray) -> None:
+    self.grid = np.asarray(grid)
+    self.lattice_vectors = np.asarray(lattice_vectors, dtype=float)
+    # {factors: grid}, {(isovalue, factors): (vertices, faces)}
+    self._grids = {}
+    self._meshes = {}
+
+  def __repr__(self) -> str:
+    return f"{self.__class__.__name__}(grid {self.grid.shape})"
+
+  def factors(self, resolution: float = None) -> tuple:
+    """Block sizes for a grid spacing of about `resolution` Å"""
+    if not resolution:
+      return (1, 1, 1)
+    spacing = np.linalg.norm(self.lattice_vectors, axis=1) / self.grid.shape
+    return tuple(int(factor) for factor in np.maximum(1, np.round(resolution / spacing)))
+
+  def downsample(self, resolution: float = None) -> np.ndarray:
+    """The grid block-averaged to a spacing of about `resolution` Å"""
+    factors = self.factors(resolution)
+    if factors not in self._grids:
+      self._grids[factors] = block_average(self.grid, factors)
+    return self._grids[factors]
+
+  def isosurface(self, isovalue: float, resolution: float = None) -> tuple:
+    """(vertices (vertex x 3) in Å, faces (face x 3)), cached"""
+    key = (float(isovalue), self.factors(resolution))
+    if key not in self._meshes:
+      factors = self.factors(resolution)
+      centers = [block_centers(*pair) for pair in zip(self.grid.shape, factors)]
+      vertices, faces = marching_tetrahedra(self.downsample(resolution), isovalue, centers)
+      self._meshes[key] = (vertices @ self.lattice_vectors, faces)
+    return self._meshes[key]
+
+
+class DensityFigure(PlotlyFigure):
+  """Isosurfaces of a density, one mesh trace per isovalue
+
+  Parameters
+  ----------
+  data : Density
+    the density, its meshes are cached across figures
+
+  Attributes
+  ----------
+  isovalues : list
+    one surface per value
+  resolution : float
+    grid spacing in Å after block averaging, None keeps the FFT grid
+  opacity : float
+  """
+  def __init__(
+    self,
+    data: Density = None,
+    width: float = 1000, height: float = 1000,
+    use_browser: str = 'chrome', mathjax_path: str = None
+  ) -> None:
+    super().__init__(
+      data,
+      width, height,
+      bgcolor = 'white', title = 'Density',
+      use_browser = use_browser, mathjax_path = mathjax_path
+    )
+    self.file.name = 'density-plot'
+    self.file.fmt = 'png'
+    self.isovalues = []
+    self.resolution = 0.3
+    self.opacity = 0.5
+
+  def create_figure(self):
+    lattice_vectors = self.data.lattice_vectors
+    corners = np.array([start for start, _ in _CELL_EDGES]) @ lattice_vectors
+    ends = np.array([end for _, end in _CELL_EDGES]) @ lattice_vectors
+    x, y, z = _segments(corners, ends)
+    traces = [plotly.graph_objs.Scatter3d(
+      x = x, y = y, z = z, mode = 'lines', name = 'cell',
+      line = {'color': 'black', 'width': 2}, hoverinfo = 'skip',
+    )]
+
+    self.colorscale.init()
+    for isovalue in self.isovalues:
+      vertices, faces = self.data.isosurface(isovalue, self.resolution)
+      traces.append(plotly.graph_objs.Mesh3d(
+        x = vertices[:, 0], y = vertices[:, 1], z = vertices[:, 2],
+        i = faces[:, 0], j = faces[:, 1], k = faces[:, 2],
+        name = f"{isovalue:g}", showlegend = True,
+        color = self.colorscale.next, opacity = self.opacity, flatshading = False,
+      ))
+
+    self.figure = plotly.graph_objs.Figure(data = traces)
+    self.figure.layout.title.text = self.title
+    self.figure.layout.paper_bgcolor = self.bgcolor
+    self.figure.layout.scene = {
+      'aspectmode': 'data',
+      'xaxis': {'visible': False}, 'yaxis': {'visible': False}, 'zaxis': {'visible': False},
+    }
+
+
+class DensitySliceFigure(PlotlyFigure):
+  """A slice of a density as heatmap or a profile as line
+
+  Parameters
+  ----------
+  data : dict
+    {'x', 'y', 'values' (x x y)} of `plane_slice` or {'x', 'values'} of
+    `planar_average` and `line_profile`, distances in Å, NaN values are
+    left blank
+
+  Attributes
+  ----------
+  is_diverging : bool
+    colors symmetric around 0, for the magnetization
+  xtitle, ytitle : str
+    axis titles, ytitle of a profile is the density
+  """
+  def __init__(
+    self,
+    data: dict = None,
+    width: float = 900, height: float = 800,
+    xmin: float = None, xmax: float = None,
+    ymin: float = None, ymax: float = None,
+    use_browser: str = 'chrome', mathjax_path: str = None
+  ) -> None:
+    super().__init__(
+      data,
+      width, height,
+      xmin, xmax,
+      ymin, ymax,
+      bgcolor = 'white', title = 'Density',
+      use_browser = use_browser, mathjax_path = mathjax_path
+    )
+    self.file.name = 'density-slice-plot'
+    self.file.fmt = 'png'
+    self.is_diverging = False
+    self.xtitle = 'Distance (Å)'
+    self.ytitle = None
+
+  @property
+  def is_slice(self) -> bool:
+    return np.ndim(self.data['values']) == 2
+
+  def create_figure(self):
+    values = np.asarray(self.data['values'])
+    if self.is_slice:
+      limit = np.nanmax(np.abs(values)) if self.is_diverging else None
+      trace = plotly.graph_objs.Heatmap(
+        x = self.data['x'], y = self.data['y'], z = values.T,
+        colorscale = 'RdBu_r' if self.is_diverging else 'Viridis',
+        zmid = 0 if self.is_diverging else None,
+        zmin = -limit if limit else None, zmax = limit if limit else None,
+      )
+    else:
+      self.colorscale.init()
+      trace = plotly.graph_objs.Scatter(
+        x = self.data['x'], y = values, mode = 'lines',
+        line = {'width': self.line.width, 'color': self.colorscale.next},
+      )
+    self.figure = plotly.graph_objs.Figure(data = [trace])
+    self.figure.layout.title.text = self.title
+    self.figure.layout.plot_bgcolor = self.bgcolor
+    self.figure.layout.xaxis.title.text = self.xtitle
+    self.figure.layout.yaxis.title.text = self.ytitle or (
+      'Distance (Å)' if self.is_slice else 'Density'
+    )
+    if self.xmin is not None or self.xmax is not None:
+      self.figure.layout.xaxis.range = self.xrange
+    if self.ymin is not None or self.ymax is not None:
+      self.figure.layout.yaxis.range = self.yrange
+    if self.is_slice:
+      # true proportions of the plane
+      self.figure.layout.yaxis.scaleanchor = 'x'